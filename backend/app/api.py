@@ -1,15 +1,29 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
-from app.models import create_db_and_models
+from app.core.cache import check_course_tables, watch_course_tables
+from app.core.snapshot import reference_snapshot
+from app.models import create_db_and_models, replicas
+from app.settings import settings
 from app.router import router
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await create_db_and_models()
+    # loads the reference snapshot as well
+    await check_course_tables()
+    await replicas.check()
+    background = [
+        asyncio.create_task(reference_snapshot.refresh_periodically()),
+        asyncio.create_task(watch_course_tables()),
+        asyncio.create_task(replicas.monitor(settings.replica_check_interval)),
+    ]
     yield
+    for task in background:
+        task.cancel()
 
 
 def create_app() -> FastAPI:
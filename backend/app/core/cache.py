@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+from fastapi import Request, Response
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.compression import accepted_encodings, brotli_compress, gzip_compress
+from sqlmodel import select
+
+from app.models import CatalogVersion, engine
+from app.settings import settings
+
+COURSE_CACHE_CHECK_INTERVAL = 30
+COURSE_CACHE_MAX_ENTRIES = 256
+# facets are cached per filter combination and clients pick those freely, so they get a cache of their own
+FACET_CACHE_MAX_ENTRIES = 1024
+# matches how long the catalog may lag behind the database anyway
+CACHE_CONTROL = 'public, max-age=30'
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+
+    @classmethod
+    def build(cls, body: bytes, headers: Optional[Dict[str, str]] = None) -> 'CachedResponse':
+        entry = cls(body=body, headers=headers or {})
+        if len(body) >= settings.compression_min_size:
+            entry.gzip = gzip_compress(body)
+            entry.br = brotli_compress(body)
+        return entry
+
+    def to_response(self, request: Request, media_type: str = 'application/json') -> Response:
+        headers = dict(self.headers)
+        if self.gzip is not None:
+            headers['Vary'] = 'Accept-Encoding'
+        if 'ETag' in headers and etag_matches(request, headers['ETag']):
+            return Response(status_code=304, headers=headers)
+        body = self.body
+        if self.gzip is not None:
+            encodings = accepted_encodings(request.headers.get('accept-encoding', ''))
+            if self.br is not None and 'br' in encodings:
+                body, headers['Content-Encoding'] = self.br, 'br'
+            elif 'gzip' in encodings:
+                body, headers['Content-Encoding'] = self.gzip, 'gzip'
+        return Response(content=body, media_type=media_type, headers=headers)
+
+
+def make_etag(*parts) -> str:
+    # weak, so the same tag stays valid for the gzip and brotli variants
+    return 'W/"%s"' % hashlib.sha1('\x1f'.join(map(str, parts)).encode()).hexdigest()[:20]
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag.removeprefix('W/') in {tag.strip().removeprefix('W/') for tag in header.split(',')}
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    return {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
+
+
+class ResponseCache:
+    """Encoded responses that stay valid until the tables behind them change, least recently used go first."""
+
+    def __init__(self, max_entries: int = COURSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: Dict[Hashable, CachedResponse] = OrderedDict()
+        self.version: Optional[str] = None
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, entry: CachedResponse, version: str) -> None:
+        # built from data older than the current version: read before the last invalidation or on a lagging replica
+        if version != self.version:
+            return
+        if key not in self.entries and len(self.entries) >= self.max_entries:
+            self.entries.popitem(last=False)
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+
+    def invalidate(self, version: Optional[str] = None) -> None:
+        self.entries = OrderedDict()
+        self.version = version
+
+
+course_cache = ResponseCache()
+facet_cache = ResponseCache(FACET_CACHE_MAX_ENTRIES)
+
+
+async def course_tables_version(session: AsyncSession) -> str:
+    """The catalog version as seen by `session`; read it before the data, on the same session."""
+    return str((await session.exec(select(CatalogVersion.version))).one())
+
+
+# reloaded with the primary's session whenever the catalog version changes, before the response caches are dropped;
+# the triggers bump the version for the reference tables too, see ReferenceSnapshot in app/core/snapshot.py
+catalog_reloaders: List[Callable[[AsyncSession], Awaitable[None]]] = []
+
+
+async def check_course_tables() -> None:
+    # always on the primary, replicas may be behind
+    caches = (course_cache, facet_cache)
+    async with AsyncSession(engine) as session:
+        version = await course_tables_version(session)
+        if all(cache.version == version for cache in caches):
+            return
+        for reload in catalog_reloaders:
+            await reload(session)
+    for cache in caches:
+        if version != cache.version:
+            cache.invalidate(version)
+
+
+async def watch_course_tables(interval: float = COURSE_CACHE_CHECK_INTERVAL) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await check_course_tables()
+        except Exception:
+            logger.exception('Failed to check course tables for changes')
+
+
+async def get_course_cache() -> ResponseCache:
+    return course_cache
+
+
+async def get_facet_cache() -> ResponseCache:
+    return facet_cache
@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import csv
+import json
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, TextIO, Tuple, Union
+
+from pydantic import ValidationError
+from sqlalchemy import Integer, String, any_, delete, func, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.models import CourseImport
+from app.models import Course, CourseGradeLink, CourseSubjectLink, Difficulty, Grade, Organization, Subject, engine
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+COURSE_FIELDS = ('title', 'description', 'start_date', 'end_date', 'image_url', 'organization_id', 'difficulty_id')
+
+# a line number and either a raw JSON line or a parsed CSV row
+FeedRecord = Tuple[int, Union[str, dict]]
+
+
+@dataclass
+class ImportReport:
+    read: int = 0
+    written: int = 0
+    failed: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def error(self, line: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'line {line}: {message}')
+
+
+def read_jsonl(file: TextIO) -> Iterator[FeedRecord]:
+    for line, text in enumerate(file, start=1):
+        if text.strip():
+            yield line, text
+
+
+def read_csv(file: TextIO) -> Iterator[FeedRecord]:
+    # line 1 is the header
+    for line, row in enumerate(csv.DictReader(file), start=2):
+        yield line, row
+
+
+class ReferenceMaps:
+    """Natural keys of the reference tables to ids, loaded once per import."""
+
+    def __init__(
+        self,
+        subjects: Dict[str, int],
+        difficulties: Dict[str, int],
+        grades: Dict[int, int],
+        organizations: Dict[str, int],
+    ):
+        self.subjects = subjects
+        self.difficulties = difficulties
+        self.grades = grades
+        self.organizations = organizations
+
+    @classmethod
+    async def load(cls, conn: AsyncConnection) -> 'ReferenceMaps':
+        async def pairs(key, id_column):
+            return dict((await conn.execute(select(key, id_column))).all())
+
+        return cls(
+            await pairs(Subject.type, Subject.id),
+            await pairs(Difficulty.type, Difficulty.id),
+            await pairs(Grade.grade, Grade.id),
+            await pairs(Organization.name, Organization.id),
+        )
+
+    def check(self, course: CourseImport) -> None:
+        unknown = [f'subject {s!r}' for s in course.subjects if s not in self.subjects]
+        unknown += [f'grade {g}' for g in course.grades if g not in self.grades]
+        if course.difficulty not in self.difficulties:
+            unknown.append(f'difficulty {course.difficulty!r}')
+        if unknown:
+            raise ValueError('unknown ' + ', '.join(unknown))
+
+    async def add_organizations(self, conn: AsyncConnection, names: Iterable[str]) -> None:
+        # organizations are free text in partner feeds, new ones are created on the fly
+        missing = sorted(set(names) - self.organizations.keys())
+        if missing:
+            await conn.execute(insert(Organization).on_conflict_do_nothing(), [{'name': name} for name in missing])
+            rows = await conn.execute(select(Organization.name, Organization.id).where(Organization.name.in_(missing)))
+            self.organizations.update(rows.all())
+
+
+def int_array(values: List[int]):
+    # one array parameter instead of one parameter per value, large batches stay under the bind parameter limit
+    return literal(values, ARRAY(Integer))
+
+
+async def replace_links(conn: AsyncConnection, model, column: str, course_ids: List[int], pairs: List[tuple]) -> None:
+    other = getattr(model, column)
+    wanted = select(func.unnest(int_array([p[0] for p in pairs])), func.unnest(int_array([p[1] for p in pairs])))
+    await conn.execute(
+        delete(model).where(
+            model.course_id == any_(int_array(course_ids)), tuple_(model.course_id, other).not_in(wanted)
+        )
+    )
+    # a single statement, so the read model triggers run once per batch rather than once per row
+    await conn.execute(insert(model).from_select(['course_id', column], wanted).on_conflict_do_nothing())
+
+
+async def write_batch(conn: AsyncConnection, references: ReferenceMaps, batch: Dict[str, CourseImport]) -> int:
+    await references.add_organizations(conn, (course.organization for course in batch.values()))
+    rows = [
+        {
+            'url': url,
+            'title': course.title,
+            'description': course.description,
+            'start_date': course.start_date,
+            'end_date': course.end_date,
+            'image_url': course.image_url,
+            'organization_id': references.organizations[course.organization],
+            'difficulty_id': references.difficulties[course.difficulty],
+        }
+        for url, course in batch.items()
+    ]
+    statement = insert(Course)
+    excluded = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=[Course.url],
+        set_={name: excluded[name] for name in COURSE_FIELDS},
+        # unchanged courses are left alone, so re-running a feed does not touch them or the caches
+        where=tuple_(*(getattr(Course, name) for name in COURSE_FIELDS)).is_distinct_from(
+            tuple_(*(excluded[name] for name in COURSE_FIELDS))
+        ),
+    ).returning(Course.id)
+    written = len((await conn.execute(statement, rows)).all())
+    urls = literal(list(batch), ARRAY(String))
+    ids = dict((await conn.execute(select(Course.url, Course.id).where(Course.url == any_(urls)))).all())
+    course_ids = list(ids.values())
+    subject_pairs = [(ids[url], references.subjects[s]) for url, course in batch.items() for s in set(course.subjects)]
+    grade_pairs = [(ids[url], references.grades[g]) for url, course in batch.items() for g in set(course.grades)]
+    await replace_links(conn, CourseSubjectLink, 'subject_id', course_ids, subject_pairs)
+    await replace_links(conn, CourseGradeLink, 'grade_id', course_ids, grade_pairs)
+    return written
+
+
+async def import_courses(
+    bind: AsyncEngine, records: Iterable[FeedRecord], batch_size: int = IMPORT_BATCH_SIZE
+) -> ImportReport:
+    """Upsert courses by url, one transaction per batch; records are consumed lazily so any feed size fits in memory."""
+    report = ImportReport()
+    async with bind.connect() as conn:
+        references = await ReferenceMaps.load(conn)
+    batch: Dict[str, CourseImport] = {}
+
+    async def flush():
+        async with bind.begin() as conn:
+            report.written += await write_batch(conn, references, batch)
+        batch.clear()
+
+    for line, raw in records:
+        report.read += 1
+        try:
+            course = CourseImport.model_validate_json(raw) if isinstance(raw, str) else CourseImport.model_validate(raw)
+            references.check(course)
+        except (ValidationError, ValueError) as e:
+            report.error(line, str(e).replace('\n', ' '))
+            continue
+        # the last occurrence of a url in a batch wins, a statement cannot upsert the same row twice
+        batch[course.url] = course
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import courses from a JSONL or CSV feed, updating them by url')
+    parser.add_argument('path', help='feed file, - for stdin')
+    parser.add_argument('--format', choices=('jsonl', 'csv'), help='defaults to the file extension')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    feed_format = args.format or ('csv' if args.path.endswith('.csv') else 'jsonl')
+    reader = read_csv if feed_format == 'csv' else read_jsonl
+
+    async def run() -> ImportReport:
+        file = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8')
+        try:
+            return await import_courses(engine, reader(file), args.batch_size)
+        finally:
+            file.close()
+            await engine.dispose()
+
+    report = asyncio.run(run())
+    print(json.dumps(report.__dict__, indent=2, ensure_ascii=False))
+    sys.exit(1 if report.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,35 @@
+import hashlib
 from datetime import date
-from typing import List
+from typing import Dict, Generic, List, Optional, TypeVar
 
-from pydantic import BaseModel, ConfigDict, field_validator
+from pydantic import BaseModel, ConfigDict, Field, computed_field, field_validator
 
-from app.models import Grade, Difficulty, Subject, Organization
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+
+T = TypeVar('T')
+
+# excludes inline icons from every item of a list, see FilterResponse
+WITHOUT_ICONS = {'__all__': {'icon'}}
+
+
+def icon_hash(icon: str) -> str:
+    return hashlib.sha256(icon.encode()).hexdigest()[:32]
 
 
 class FilterResponse(BaseModel):
     id: int
     type: str
     label: str
+    # raw svg markup, only sent when asked for with ?inline_icons=true, icon_url serves the same image
     icon: str
     color: str
 
+    @computed_field
+    @property
+    def icon_url(self) -> str:
+        return f'/icons/{icon_hash(self.icon)}.svg'
+
 
 class SubjectResponse(FilterResponse):
     additional_description: List[str]
@@ -32,6 +49,47 @@ class GradeResponse(BaseModel):
     grade: int
 
 
+class CourseFilter(BaseModel):
+    subjects: List[str] = []
+    grades: List[int] = []
+    difficulties: List[str] = []
+    organizations: List[str] = []
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return not (
+            self.subjects or self.grades or self.difficulties or self.organizations or self.start_date or self.end_date
+        )
+
+    @property
+    def cache_key(self) -> tuple:
+        # the same filter however its values were ordered or repeated in the query string
+        return (
+            tuple(sorted(set(self.subjects))),
+            tuple(sorted(set(self.grades))),
+            tuple(sorted(set(self.difficulties))),
+            tuple(sorted(set(self.organizations))),
+            self.start_date,
+            self.end_date,
+        )
+
+
+class CoursePageQuery(CourseFilter):
+    cursor: Optional[str] = None
+    limit: int = Field(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+
+
+class CatalogQuery(CoursePageQuery):
+    inline_icons: bool = False
+
+
+class CourseSearchQuery(CourseFilter):
+    q: str = Field(min_length=1, max_length=200)
+    limit: int = Field(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+
+
 class CourseResponse(BaseModel):
     id: int
     title: str
@@ -43,29 +101,63 @@ class CourseResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)  # pydantic v2
 
     grades: List[int]
+    difficulty: str
+    subjects: List[str]
+    organization: str
 
-    @field_validator('grades', mode='before')
-    @classmethod
-    def serialize_grades(cls, grades: List[Grade]) -> List[int]:
-        return [int(i.grade) for i in grades]
 
-    difficulty: str
+class CatalogCourseResponse(BaseModel):
+    id: int
+    title: str
+    description: str
+    start_date: date
+    end_date: date
+    url: str
+    image_url: str
+    grades: List[int]
+    subject_ids: List[int]
+    difficulty_id: int
+    organization_id: int
 
-    @field_validator('difficulty', mode='before')
-    @classmethod
-    def serialize_difficulty(cls, difficulty: Difficulty) -> str:
-        return difficulty.type
 
-    subjects: List[str]
+class CatalogResponse(BaseModel):
+    subjects: List[SubjectResponse]
+    difficulties: List[DifficultyResponse]
+    grades: List[GradeResponse]
+    organizations: List[OrganizationResponse]
+    courses: List[CatalogCourseResponse]
+    next_cursor: Optional[str]
 
-    @field_validator('subjects', mode='before')
-    @classmethod
-    def serialize_subjects(cls, subjects: List[Subject]) -> List[str]:
-        return [str(i.type) for i in subjects]
 
-    organization: str
+class FacetsResponse(BaseModel):
+    total: int
+    subjects: Dict[str, int] = {}
+    grades: Dict[int, int] = {}
+    difficulties: Dict[str, int] = {}
+    organizations: Dict[str, int] = {}
+
+
+class BatchResponse(BaseModel, Generic[T]):
+    items: List[T]
+    missing: List[int]
+
+
+class CourseImport(BaseModel):
+    title: str
+    description: str = ''
+    start_date: date
+    end_date: date
+    url: str = Field(min_length=1)
+    image_url: str
+    organization: str = Field(min_length=1)
+    difficulty: str
+    subjects: List[str] = Field(min_length=1)
+    grades: List[int] = Field(min_length=1)
 
-    @field_validator('organization', mode='before')
+    @field_validator('subjects', 'grades', mode='before')
     @classmethod
-    def serialize_organization(cls, organization: Organization) -> str:
-        return organization.name
+    def split_list(cls, value):
+        # CSV cells hold lists as "ai;programming"
+        if isinstance(value, str):
+            return [item.strip() for item in value.split(';') if item.strip()]
+        return value
@@ -0,0 +1,28 @@
+import base64
+import json
+from datetime import date
+from typing import Tuple
+
+from app.models import MAX_ID, Course
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(course: Course) -> str:
+    raw = json.dumps([course.start_date.isoformat(), course.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        start_date, id = json.loads(raw)
+        # bool is an int too, and floats would be truncated silently
+        if not isinstance(start_date, str) or not isinstance(id, int) or isinstance(id, bool):
+            raise TypeError('cursor must hold a date string and an integer id')
+        if not 0 <= id <= MAX_ID:
+            raise ValueError('cursor id is out of range')
+        return date.fromisoformat(start_date), id
+    except (ValueError, TypeError, OverflowError, RecursionError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
@@ -0,0 +1,102 @@
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    ColumnElement,
+    Select,
+    String,
+    and_,
+    cast,
+    func,
+    literal,
+    or_,
+    select,
+    true,
+    tuple_,
+    union_all,
+)
+from sqlmodel.sql.expression import SelectOfScalar
+
+from app.core.models import CourseFilter
+from app.models import Course, CourseRead, course_search_vector
+
+FACETS = ('subjects', 'grades', 'difficulties', 'organizations')
+
+
+def facet_conditions(filters: CourseFilter) -> Dict[str, ColumnElement]:
+    # values inside one filter are OR-ed, different filters are AND-ed;
+    # subjects and grades are arrays on the read model, matched by overlap through their GIN indexes
+    conditions = {}
+    if filters.subjects:
+        conditions['subjects'] = CourseRead.subjects.overlap(filters.subjects)
+    if filters.grades:
+        conditions['grades'] = CourseRead.grades.overlap(filters.grades)
+    if filters.difficulties:
+        conditions['difficulties'] = CourseRead.difficulty.in_(filters.difficulties)
+    if filters.organizations:
+        conditions['organizations'] = CourseRead.organization.in_(filters.organizations)
+    return conditions
+
+
+def date_conditions(filters: CourseFilter) -> List[ColumnElement]:
+    conditions = []
+    if filters.start_date is not None:
+        conditions.append(CourseRead.start_date >= filters.start_date)
+    if filters.end_date is not None:
+        conditions.append(CourseRead.end_date <= filters.end_date)
+    return conditions
+
+
+def filter_courses(statement: SelectOfScalar, filters: CourseFilter) -> SelectOfScalar:
+    return statement.where(*facet_conditions(filters).values(), *date_conditions(filters))
+
+
+def facet_counts(filters: CourseFilter) -> Select:
+    # every course becomes one row per facet value, so a single pass groups them all; each facet is counted under
+    # the other facets' filters but not its own, which is what a filter panel shows next to its options.
+    # The () grouping set adds one row with the number of courses matching every filter.
+    conditions = facet_conditions(filters)
+    values = union_all(
+        select(literal('subjects').label('facet'), func.unnest(CourseRead.subjects).label('value')).correlate(
+            CourseRead
+        ),
+        select(literal('grades'), cast(func.unnest(CourseRead.grades), String)).correlate(CourseRead),
+        select(literal('difficulties'), CourseRead.difficulty).correlate(CourseRead),
+        select(literal('organizations'), CourseRead.organization).correlate(CourseRead),
+    ).lateral('facet_values')
+    facet, value = values.c.facet, values.c.value
+    under_other_filters = or_(
+        *(and_(facet == name, *(c for other, c in conditions.items() if other != name)) for name in FACETS)
+    )
+    under_all_filters = and_(facet == 'difficulties', *conditions.values())
+    return (
+        select(
+            facet,
+            value,
+            func.count().filter(under_other_filters),
+            func.count().filter(under_all_filters),
+        )
+        .select_from(CourseRead)
+        .join(values, true())
+        .where(*date_conditions(filters))
+        .group_by(func.grouping_sets(tuple_(facet, value), tuple_()))
+    )
+
+
+def paginate_courses(statement: SelectOfScalar, after: Optional[Tuple[date, int]], limit: int) -> SelectOfScalar:
+    # keyset pagination over (start_date, id), served by ix_courseread_start_date_id;
+    # one extra row is fetched to tell whether there is a next page
+    if after is not None:
+        statement = statement.where(tuple_(CourseRead.start_date, CourseRead.id) > tuple_(*after))
+    return statement.order_by(CourseRead.start_date, CourseRead.id).limit(limit + 1)
+
+
+def search_courses(statement: SelectOfScalar, q: str, limit: int) -> SelectOfScalar:
+    # websearch syntax accepts raw user input: quotes, "or" and -exclusions
+    tsquery = func.websearch_to_tsquery('russian', q)
+    return (
+        statement.join(Course, Course.id == CourseRead.id)
+        .where(course_search_vector.op('@@')(tsquery))
+        .order_by(func.ts_rank(course_search_vector, tsquery).desc(), CourseRead.id)
+        .limit(limit)
+    )
@@ -1,102 +1,369 @@
-from typing import List
+from typing import Annotated, List, Optional, Sequence, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import selectinload
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.models import CourseResponse, SubjectResponse, OrganizationResponse, GradeResponse, DifficultyResponse
-from app.models import get_session, Course, Subject, Organization, Grade, Difficulty
+from app.core.models import (
+    BatchResponse,
+    WITHOUT_ICONS,
+    CatalogCourseResponse,
+    CatalogQuery,
+    CatalogResponse,
+    CourseFilter,
+    FacetsResponse,
+    CoursePageQuery,
+    CourseSearchQuery,
+    CourseResponse,
+    SubjectResponse,
+    OrganizationResponse,
+    GradeResponse,
+    DifficultyResponse,
+)
+from app.core.cache import (
+    CachedResponse,
+    ResponseCache,
+    cache_headers,
+    course_tables_version,
+    etag_matches,
+    get_course_cache,
+    get_facet_cache,
+    make_etag,
+    not_modified,
+)
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.queries import FACETS, facet_counts, filter_courses, paginate_courses, search_courses
+from app.core.snapshot import ReferenceSnapshot, get_reference_snapshot
+from app.metrics import track_serialization
+from app.models import MAX_ID, get_session, CourseRead
 
 core_router = APIRouter()
 
+courses_adapter = TypeAdapter(List[CourseResponse])
+
+MAX_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 1000
+
+
+def batch_ids(ids: str = Query(pattern=r'^\d+(,\d+)*$', description='Comma separated ids')) -> List[int]:
+    unique = list(dict.fromkeys(int(i) for i in ids.split(',')))
+    if len(unique) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f'At most {MAX_BATCH_SIZE} ids per request')
+    # checked here for every batch endpoint, though only the course one sends the ids to the database
+    if any(i > MAX_ID for i in unique):
+        raise HTTPException(status_code=400, detail=f'Ids must not exceed {MAX_ID}')
+    return unique
+
+
+async def fetch_course_page(
+    session: AsyncSession, query: CoursePageQuery
+) -> Tuple[Sequence[CourseRead], Optional[str]]:
+    try:
+        after = decode_cursor(query.cursor) if query.cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    statement = paginate_courses(filter_courses(select(CourseRead), query), after, query.limit)
+    courses = (await session.exec(statement)).all()
+    if len(courses) > query.limit:
+        courses = courses[: query.limit]
+        return courses, encode_cursor(courses[-1])
+    return courses, None
+
 
 @core_router.get('/subjects/', response_model=List[SubjectResponse])
-async def get_subjects(session: AsyncSession = Depends(get_session)):
-    result = await session.exec(select(Subject))
-    return result.all()
+async def get_subjects(
+    request: Request, inline_icons: bool = False, reference: ReferenceSnapshot = Depends(get_reference_snapshot)
+):
+    return reference.list_response(request, 'subjects', inline_icons)
+
+
+@core_router.get('/subjects/batch/', response_model=BatchResponse[SubjectResponse])
+async def get_subjects_batch(
+    request: Request,
+    ids: List[int] = Depends(batch_ids),
+    inline_icons: bool = False,
+    reference: ReferenceSnapshot = Depends(get_reference_snapshot),
+):
+    return reference.batch_response(request, 'subjects', ids, inline_icons)
 
 
 @core_router.get('/subjects/{id}', response_model=SubjectResponse)
-async def get_subject(id: int, session: AsyncSession = Depends(get_session)):
-    result = await session.exec(select(Subject).where(Subject.id == id))
-    subject = result.first()
+async def get_subject(
+    id: int,
+    request: Request,
+    inline_icons: bool = False,
+    reference: ReferenceSnapshot = Depends(get_reference_snapshot),
+):
+    subject = reference.subjects.get(id)
     if not subject:
         raise HTTPException(status_code=404, detail='Subject not found')
-    return subject
+    return reference.item_response(request, 'subjects', subject, inline_icons)
 
 
 @core_router.get('/difficulties/', response_model=List[DifficultyResponse])
-async def get_difficulties(session: AsyncSession = Depends(get_session)):
-    result = await session.exec(select(Difficulty))
-    return result.all()
+async def get_difficulties(
+    request: Request, inline_icons: bool = False, reference: ReferenceSnapshot = Depends(get_reference_snapshot)
+):
+    return reference.list_response(request, 'difficulties', inline_icons)
+
+
+@core_router.get('/difficulties/batch/', response_model=BatchResponse[DifficultyResponse])
+async def get_difficulties_batch(
+    request: Request,
+    ids: List[int] = Depends(batch_ids),
+    inline_icons: bool = False,
+    reference: ReferenceSnapshot = Depends(get_reference_snapshot),
+):
+    return reference.batch_response(request, 'difficulties', ids, inline_icons)
 
 
 @core_router.get('/difficulties/{id}', response_model=DifficultyResponse)
-async def get_difficulty(id: int, session: AsyncSession = Depends(get_session)):
-    result = await session.exec(select(Difficulty).where(Difficulty.id == id))
-    difficulty = result.first()
+async def get_difficulty(
+    id: int,
+    request: Request,
+    inline_icons: bool = False,
+    reference: ReferenceSnapshot = Depends(get_reference_snapshot),
+):
+    difficulty = reference.difficulties.get(id)
     if not difficulty:
         raise HTTPException(status_code=404, detail='Difficulty not found')
-    return difficulty
+    return reference.item_response(request, 'difficulties', difficulty, inline_icons)
 
 
 @core_router.get('/organizations/', response_model=List[OrganizationResponse])
-async def get_organizations(session: AsyncSession = Depends(get_session)):
-    result = await session.exec(select(Organization))
-    return result.all()
+async def get_organizations(request: Request, reference: ReferenceSnapshot = Depends(get_reference_snapshot)):
+    return reference.list_response(request, 'organizations')
+
+
+@core_router.get('/organizations/batch/', response_model=BatchResponse[OrganizationResponse])
+async def get_organizations_batch(
+    request: Request,
+    ids: List[int] = Depends(batch_ids),
+    reference: ReferenceSnapshot = Depends(get_reference_snapshot),
+):
+    return reference.batch_response(request, 'organizations', ids)
 
 
 @core_router.get('/organizations/{id}', response_model=OrganizationResponse)
-async def get_organization(id: int, session: AsyncSession = Depends(get_session)):
-    result = await session.exec(select(Organization).where(Organization.id == id))
-    organization = result.first()
+async def get_organization(id: int, request: Request, reference: ReferenceSnapshot = Depends(get_reference_snapshot)):
+    organization = reference.organizations.get(id)
     if not organization:
         raise HTTPException(status_code=404, detail='Organization not found')
-    return organization
+    return reference.item_response(request, 'organizations', organization)
 
 
 @core_router.get('/grades/', response_model=List[GradeResponse])
-async def get_grades(session: AsyncSession = Depends(get_session)):
-    result = await session.exec(select(Grade))
-    return result.all()
+async def get_grades(request: Request, reference: ReferenceSnapshot = Depends(get_reference_snapshot)):
+    return reference.list_response(request, 'grades')
+
+
+@core_router.get('/grades/batch/', response_model=BatchResponse[GradeResponse])
+async def get_grades_batch(
+    request: Request,
+    ids: List[int] = Depends(batch_ids),
+    reference: ReferenceSnapshot = Depends(get_reference_snapshot),
+):
+    return reference.batch_response(request, 'grades', ids)
 
 
 @core_router.get('/grades/{id}', response_model=GradeResponse)
-async def get_grade(id: int, session: AsyncSession = Depends(get_session)):
-    result = await session.exec(select(Grade).where(Grade.id == id))
-    grade = result.first()
+async def get_grade(id: int, request: Request, reference: ReferenceSnapshot = Depends(get_reference_snapshot)):
+    grade = reference.grades.get(id)
     if not grade:
         raise HTTPException(status_code=404, detail='Grade not found')
-    return grade
+    return reference.item_response(request, 'grades', grade)
+
+
+@core_router.get('/icons/{icon_hash}.svg', response_class=Response)
+async def get_icon(icon_hash: str, request: Request, reference: ReferenceSnapshot = Depends(get_reference_snapshot)):
+    response = reference.icon_response(request, icon_hash)
+    if not response:
+        raise HTTPException(status_code=404, detail='Icon not found')
+    return response
 
 
 @core_router.get('/courses/', response_model=List[CourseResponse])
-async def get_courses(session: AsyncSession = Depends(get_session)):
-    result = await session.exec(
-        select(Course).options(
-            selectinload(Course.subjects),
-            selectinload(Course.grades),
-            selectinload(Course.organization),
-            selectinload(Course.difficulty),
+async def get_courses(
+    request: Request,
+    query: Annotated[CoursePageQuery, Query()],
+    cache: ResponseCache = Depends(get_course_cache),
+    session: AsyncSession = Depends(get_session),
+):
+    params = sorted(request.query_params.multi_items())
+    etag = make_etag(cache.version, params)
+    # the unfiltered catalog is the same for every visitor, keep its encoded pages around
+    cache_key = (query.cursor, query.limit) if query.is_empty else None
+    if cache_key and (cached := cache.get(cache_key)):
+        return cached.to_response(request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    version = await course_tables_version(session)
+    etag = make_etag(version, params)
+    courses, next_cursor = await fetch_course_page(session, query)
+    headers = cache_headers(etag)
+    if next_cursor:
+        headers['X-Next-Cursor'] = next_cursor
+    with track_serialization():
+        body = courses_adapter.dump_json(courses_adapter.validate_python(courses, from_attributes=True))
+    entry = CachedResponse.build(body, headers)
+    if cache_key:
+        cache.put(cache_key, entry, version)
+    return entry.to_response(request)
+
+
+@core_router.get('/courses/search/', response_model=List[CourseResponse])
+async def get_courses_search(
+    request: Request,
+    query: Annotated[CourseSearchQuery, Query()],
+    cache: ResponseCache = Depends(get_course_cache),
+    session: AsyncSession = Depends(get_session),
+):
+    params = sorted(request.query_params.multi_items())
+    etag = make_etag(cache.version, 'search', params)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    etag = make_etag(await course_tables_version(session), 'search', params)
+    statement = search_courses(filter_courses(select(CourseRead), query), query.q, query.limit)
+    courses = (await session.exec(statement)).all()
+    with track_serialization():
+        body = courses_adapter.dump_json(courses_adapter.validate_python(courses, from_attributes=True))
+    return CachedResponse.build(body, cache_headers(etag)).to_response(request)
+
+
+@core_router.get('/courses/facets/', response_model=FacetsResponse)
+async def get_course_facets(
+    request: Request,
+    filters: Annotated[CourseFilter, Query()],
+    cache: ResponseCache = Depends(get_facet_cache),
+    session: AsyncSession = Depends(get_session),
+):
+    cache_key = ('facets', filters.cache_key)
+    if cached := cache.get(cache_key):
+        return cached.to_response(request)
+    etag = make_etag(cache.version, *cache_key)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    version = await course_tables_version(session)
+    etag = make_etag(version, *cache_key)
+    counts, total = {facet: {} for facet in FACETS}, 0
+    for facet, value, count, matching in await session.exec(facet_counts(filters)):
+        if facet is None:
+            total = matching
+        else:
+            counts[facet][value] = count
+    facets = FacetsResponse(total=total, **counts)
+    entry = CachedResponse.build(facets.model_dump_json().encode(), cache_headers(etag))
+    cache.put(cache_key, entry, version)
+    return entry.to_response(request)
+
+
+@core_router.get('/courses/export/', response_class=StreamingResponse)
+async def export_courses(
+    request: Request,
+    filters: Annotated[CourseFilter, Query()],
+    cache: ResponseCache = Depends(get_course_cache),
+    session: AsyncSession = Depends(get_session),
+):
+    # one course per line, read through a server-side cursor so memory stays flat whatever the catalog size
+    params = sorted(request.query_params.multi_items())
+    etag = make_etag(cache.version, 'export', params)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    etag = make_etag(await course_tables_version(session), 'export', params)
+    statement = filter_courses(select(CourseRead), filters).order_by(CourseRead.start_date, CourseRead.id)
+    # the request's session is closed before a streaming body is sent, the export needs its own on the same engine
+    bind = session.bind
+
+    async def lines():
+        async with AsyncSession(bind) as export_session:
+            result = await export_session.stream_scalars(statement.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+            async for courses in result.partitions():
+                with track_serialization():
+                    chunk = b''.join(
+                        CourseResponse.model_validate(course).model_dump_json().encode() + b'\n' for course in courses
+                    )
+                yield chunk
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson', headers=cache_headers(etag))
+
+
+@core_router.get('/courses/batch/', response_model=BatchResponse[CourseResponse])
+async def get_courses_batch(
+    request: Request,
+    ids: List[int] = Depends(batch_ids),
+    cache: ResponseCache = Depends(get_course_cache),
+    session: AsyncSession = Depends(get_session),
+):
+    etag = make_etag(cache.version, 'batch', ids)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    etag = make_etag(await course_tables_version(session), 'batch', ids)
+    courses = {course.id: course for course in (await session.exec(select(CourseRead).where(CourseRead.id.in_(ids))))}
+    with track_serialization():
+        batch = BatchResponse[CourseResponse](
+            items=[CourseResponse.model_validate(courses[i]) for i in ids if i in courses],
+            missing=[i for i in ids if i not in courses],
         )
-    )
-    return result.all()
+        body = batch.model_dump_json().encode()
+    return CachedResponse.build(body, cache_headers(etag)).to_response(request)
 
 
 @core_router.get('/courses/{id}', response_model=CourseResponse)
-async def get_course(id: int, session: AsyncSession = Depends(get_session)):
-    result = await session.exec(
-        select(Course)
-        .where(Course.id == id)
-        .options(
-            selectinload(Course.subjects),
-            selectinload(Course.grades),
-            selectinload(Course.organization),
-            selectinload(Course.difficulty),
-        )
-    )
+async def get_course(
+    id: int,
+    request: Request,
+    cache: ResponseCache = Depends(get_course_cache),
+    session: AsyncSession = Depends(get_session),
+):
+    etag = make_etag(cache.version, id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    etag = make_etag(await course_tables_version(session), id)
+    result = await session.exec(select(CourseRead).where(CourseRead.id == id))
     course = result.first()
     if not course:
         raise HTTPException(status_code=404, detail='Course not found')
-    return course
+    with track_serialization():
+        body = CourseResponse.model_validate(course, from_attributes=True).model_dump_json().encode()
+    return CachedResponse(body, cache_headers(etag)).to_response(request)
+
+
+@core_router.get('/catalog/', response_model=CatalogResponse)
+async def get_catalog(
+    request: Request,
+    query: Annotated[CatalogQuery, Query()],
+    reference: ReferenceSnapshot = Depends(get_reference_snapshot),
+    cache: ResponseCache = Depends(get_course_cache),
+    session: AsyncSession = Depends(get_session),
+):
+    # everything the catalog page needs in one response; courses point at the reference lists by id
+    # the reference lists come from the snapshot, which reloads on its own schedule
+    params = (reference.version, 'catalog', sorted(request.query_params.multi_items()))
+    etag = make_etag(cache.version, *params)
+    cache_key = (
+        ('catalog', reference.version, query.cursor, query.limit, query.inline_icons) if query.is_empty else None
+    )
+    if cache_key and (cached := cache.get(cache_key)):
+        return cached.to_response(request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    version = await course_tables_version(session)
+    etag = make_etag(version, *params)
+    courses, next_cursor = await fetch_course_page(session, query)
+    with track_serialization():
+        catalog = CatalogResponse(
+            subjects=list(reference.subjects.values()),
+            difficulties=list(reference.difficulties.values()),
+            grades=list(reference.grades.values()),
+            organizations=list(reference.organizations.values()),
+            courses=[CatalogCourseResponse.model_validate(course, from_attributes=True) for course in courses],
+            next_cursor=next_cursor,
+        )
+        exclude = None if query.inline_icons else {'subjects': WITHOUT_ICONS, 'difficulties': WITHOUT_ICONS}
+        body = catalog.model_dump_json(exclude=exclude).encode()
+    entry = CachedResponse.build(body, cache_headers(etag))
+    if cache_key:
+        cache.put(cache_key, entry, version)
+    return entry.to_response(request)
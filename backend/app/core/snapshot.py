@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Depends, Request, Response
+from pydantic import BaseModel, TypeAdapter
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.cache import CachedResponse, cache_headers, catalog_reloaders, make_etag
+from app.core.models import (
+    WITHOUT_ICONS,
+    BatchResponse,
+    DifficultyResponse,
+    FilterResponse,
+    GradeResponse,
+    OrganizationResponse,
+    SubjectResponse,
+    icon_hash,
+)
+from app.metrics import track_serialization
+from app.models import Difficulty, Grade, Organization, Subject, engine, get_session
+
+REFERENCE_TTL = 300
+ICON_COLLECTIONS = ('subjects', 'difficulties')
+# icons are addressed by the hash of their content, so a url never changes what it points to
+ICON_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# the stored icons are the inner markup of a 24x24 material icon unless they are a complete document
+ICON_DOCUMENT = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24">{}</svg>'
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceSnapshot:
+    """Process-local copy of the small reference tables, keyed by id."""
+
+    models = {
+        'subjects': SubjectResponse,
+        'difficulties': DifficultyResponse,
+        'grades': GradeResponse,
+        'organizations': OrganizationResponse,
+    }
+
+    def __init__(self, ttl: float = REFERENCE_TTL):
+        self.ttl = ttl
+        self.subjects: Dict[int, SubjectResponse] = {}
+        self.difficulties: Dict[int, DifficultyResponse] = {}
+        self.grades: Dict[int, GradeResponse] = {}
+        self.organizations: Dict[int, OrganizationResponse] = {}
+        # encoded list responses with and without inline icons, their ETags double as the version of each collection
+        self.lists: Dict[Tuple[str, bool], CachedResponse] = {}
+        self.icons: Dict[str, CachedResponse] = {}
+        # changes whenever any list does, for responses that embed the lists
+        self.version: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    async def load(self, session: AsyncSession) -> None:
+        subjects = (await session.exec(select(Subject).order_by(Subject.id))).all()
+        difficulties = (await session.exec(select(Difficulty).order_by(Difficulty.id))).all()
+        grades = (await session.exec(select(Grade).order_by(Grade.id))).all()
+        organizations = (await session.exec(select(Organization).order_by(Organization.id))).all()
+        # swap the dicts only once everything is read, readers never see a half-loaded snapshot
+        self.subjects = {i.id: SubjectResponse.model_validate(i, from_attributes=True) for i in subjects}
+        self.difficulties = {i.id: DifficultyResponse.model_validate(i, from_attributes=True) for i in difficulties}
+        self.grades = {i.id: GradeResponse.model_validate(i, from_attributes=True) for i in grades}
+        self.organizations = {i.id: OrganizationResponse.model_validate(i, from_attributes=True) for i in organizations}
+        self.lists = {
+            (collection, inline_icons): encode_list(
+                self.models[collection], getattr(self, collection).values(), inline_icons
+            )
+            for collection in self.models
+            for inline_icons in (False, True)
+        }
+        self.icons = {
+            icon_hash(item.icon): encode_icon(item.icon)
+            for collection in ICON_COLLECTIONS
+            for item in getattr(self, collection).values()
+        }
+        self.version = make_etag(*(entry.headers['ETag'] for entry in self.lists.values()))
+        self.loaded_at = time.monotonic()
+
+    def list_response(self, request: Request, collection: str, inline_icons: bool = False) -> Response:
+        return self.lists[collection, inline_icons].to_response(request)
+
+    def item_response(self, request: Request, collection: str, item: BaseModel, inline_icons: bool = False) -> Response:
+        with track_serialization():
+            body = item.model_dump_json(exclude=None if inline_icons else {'icon'}).encode()
+        return CachedResponse(body, self.lists[collection, inline_icons].headers).to_response(request)
+
+    def batch_response(self, request: Request, collection: str, ids: List[int], inline_icons: bool = False) -> Response:
+        items = getattr(self, collection)
+        with track_serialization():
+            batch = BatchResponse[self.models[collection]](
+                items=[items[i] for i in ids if i in items],
+                missing=[i for i in ids if i not in items],
+            )
+            body = batch.model_dump_json(exclude=None if inline_icons else {'items': WITHOUT_ICONS}).encode()
+        return CachedResponse(body, self.lists[collection, inline_icons].headers).to_response(request)
+
+    def icon_response(self, request: Request, icon_hash: str) -> Optional[Response]:
+        icon = self.icons.get(icon_hash)
+        return icon.to_response(request, media_type='image/svg+xml') if icon else None
+
+    def invalidate(self) -> None:
+        self.loaded_at = None
+
+    async def refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl)
+            try:
+                async with AsyncSession(engine) as session:
+                    await self.load(session)
+            except Exception:
+                logger.exception('Failed to refresh reference snapshot')
+
+
+def encode_list(model: type, items, inline_icons: bool) -> CachedResponse:
+    exclude = WITHOUT_ICONS if issubclass(model, FilterResponse) and not inline_icons else None
+    body = TypeAdapter(List[model]).dump_json(list(items), exclude=exclude)
+    return CachedResponse.build(body, cache_headers(make_etag(body)))
+
+
+def encode_icon(icon: str) -> CachedResponse:
+    document = icon if icon.lstrip().startswith(('<svg', '<?xml')) else ICON_DOCUMENT.format(icon)
+    return CachedResponse.build(
+        document.encode(), {'ETag': f'"{icon_hash(icon)}"', 'Cache-Control': ICON_CACHE_CONTROL}
+    )
+
+
+reference_snapshot = ReferenceSnapshot()
+# new organizations come with the courses that use them, the TTL is only a backstop
+catalog_reloaders.append(reference_snapshot.load)
+
+
+async def get_reference_snapshot(session: AsyncSession = Depends(get_session)) -> ReferenceSnapshot:
+    # the session only checks out a connection when a query runs, so a loaded snapshot never touches the pool
+    if not reference_snapshot.is_loaded:
+        await reference_snapshot.load(session)
+    return reference_snapshot
@@ -0,0 +1,179 @@
+import io
+import json
+from datetime import date
+
+import pytest
+import pytest_asyncio
+from psycopg import Connection
+from pytest_postgresql import factories
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.cache import course_tables_version
+from app.core.importer import import_courses, read_csv, read_jsonl
+from app.models import Course, CourseRead, Difficulty, Grade, Organization, Subject
+
+postgresql_proc = factories.postgresql_proc(dbname='test_db')
+postgresql = factories.postgresql('postgresql_proc')
+
+
+def feed_line(url: str, **overrides) -> str:
+    record = {
+        'title': 'Python Fundamentals',
+        'description': 'Learn Python programming',
+        'start_date': '2025-09-01',
+        'end_date': '2025-12-01',
+        'url': url,
+        'image_url': 'https://placehold.co/100x100',
+        'organization': 'Coding Academy',
+        'difficulty': 'beginner',
+        'subjects': ['programming'],
+        'grades': [9, 10],
+    }
+    record.update(overrides)
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+@pytest_asyncio.fixture(name='engine')
+async def engine_fixture(postgresql: Connection):
+    engine = create_async_engine(
+        f'postgresql+asyncpg://'
+        f'{postgresql.info.user}:'
+        f'{postgresql.info.password}@'
+        f'{postgresql.info.host}:{postgresql.info.port}/'
+        f'{postgresql.info.dbname}'
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine) as session:
+        for subject in ('ai', 'programming'):
+            session.add(Subject(type=subject, label=subject, icon='<path/>', color='#000', additional_description=[]))
+        session.add(Difficulty(type='beginner', label='Beginner', icon='<path/>', color='#000'))
+        session.add_all([Grade(grade=grade) for grade in (9, 10, 11)])
+        session.add(Organization(name='Coding Academy'))
+        await session.commit()
+    yield engine
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_import_jsonl(engine):
+    feed = io.StringIO(
+        feed_line('https://example.com/1')
+        + '\n'
+        + feed_line('https://example.com/2', organization='Science School', subjects=['ai', 'programming'])
+        + feed_line('https://example.com/3', grades=[11])
+    )
+    report = await import_courses(engine, read_jsonl(feed), batch_size=2)
+    assert (report.read, report.written, report.failed) == (3, 3, 0)
+    async with AsyncSession(engine) as session:
+        courses = (await session.exec(select(CourseRead).order_by(CourseRead.url))).all()
+    assert [course.url for course in courses] == [f'https://example.com/{i}' for i in (1, 2, 3)]
+    assert courses[0].grades == [9, 10]
+    assert courses[1].subjects == ['ai', 'programming']
+    assert courses[1].organization == 'Science School'
+    assert courses[2].start_date == date(2025, 9, 1)
+
+
+@pytest.mark.asyncio
+async def test_import_is_idempotent(engine):
+    feed = feed_line('https://example.com/1') + feed_line('https://example.com/2')
+    await import_courses(engine, read_jsonl(io.StringIO(feed)))
+    async with AsyncSession(engine) as session:
+        version = await course_tables_version(session)
+    report = await import_courses(engine, read_jsonl(io.StringIO(feed)))
+    assert (report.read, report.written) == (2, 0)
+    # nothing changed, so the response caches are kept
+    async with AsyncSession(engine) as session:
+        assert await course_tables_version(session) == version
+
+    changed = feed_line('https://example.com/1', title='Python Advanced', subjects=['ai'], grades=[11])
+    report = await import_courses(engine, read_jsonl(io.StringIO(changed)))
+    assert report.written == 1
+    async with AsyncSession(engine) as session:
+        assert (await session.exec(select(func.count()).select_from(Course))).one() == 2
+        course = (await session.exec(select(CourseRead).where(CourseRead.url == 'https://example.com/1'))).one()
+    assert course.title == 'Python Advanced'
+    assert course.subjects == ['ai']
+    assert course.grades == [11]
+
+
+@pytest.mark.asyncio
+async def test_import_csv(engine):
+    feed = io.StringIO(
+        'title,description,start_date,end_date,url,image_url,organization,difficulty,subjects,grades\n'
+        'Основы ИИ,,2025-09-01,2025-12-01,https://example.com/ai,https://placehold.co/1,Coding Academy,beginner,'
+        'ai;programming,9;10;11\n'
+    )
+    report = await import_courses(engine, read_csv(feed))
+    assert (report.read, report.written, report.failed) == (1, 1, 0)
+    async with AsyncSession(engine) as session:
+        course = (await session.exec(select(CourseRead))).one()
+    assert course.subjects == ['ai', 'programming']
+    assert course.grades == [9, 10, 11]
+
+
+@pytest.mark.asyncio
+async def test_import_reports_bad_records(engine):
+    feed = io.StringIO(
+        feed_line('https://example.com/1', subjects=['cooking'])
+        + '{"title": \n'
+        + feed_line('https://example.com/2', difficulty='expert', grades=[1])
+        + feed_line('https://example.com/3')
+    )
+    report = await import_courses(engine, read_jsonl(feed))
+    assert (report.read, report.written, report.failed) == (4, 1, 3)
+    assert report.errors[0] == "line 1: unknown subject 'cooking'"
+    assert report.errors[1].startswith('line 2: ')
+    assert report.errors[2] == "line 3: unknown grade 1, difficulty 'expert'"
+
+
+OLD_SCHEMA_INDEXES = (
+    'ix_course_url',
+    'ix_course_start_date_id',
+    'ix_coursesubjectlink_subject_id_course_id',
+    'ix_coursegradelink_grade_id_course_id',
+)
+
+
+async def drop_new_indexes(engine):
+    # a database created before the indexes existed, create_all leaves its tables alone
+    async with engine.begin() as conn:
+        for index in OLD_SCHEMA_INDEXES:
+            await conn.execute(text(f'DROP INDEX {index}'))
+
+
+@pytest.mark.asyncio
+async def test_startup_adds_indexes_to_existing_tables(engine):
+    await drop_new_indexes(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        indexes = (await conn.execute(text('SELECT indexname FROM pg_indexes'))).scalars().all()
+    assert set(OLD_SCHEMA_INDEXES) <= set(indexes)
+
+    feed = feed_line('https://example.com/1') + feed_line('https://example.com/2')
+    report = await import_courses(engine, read_jsonl(io.StringIO(feed)))
+    assert (report.written, report.failed) == (2, 0)
+    report = await import_courses(engine, read_jsonl(io.StringIO(feed_line('https://example.com/1', title='New'))))
+    assert (report.written, report.failed) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_startup_names_duplicate_urls(engine):
+    await drop_new_indexes(engine)
+    async with engine.begin() as conn:
+        for _ in range(2):
+            await conn.execute(
+                text(
+                    'INSERT INTO course (title, description, start_date, end_date, url, image_url, '
+                    'organization_id, difficulty_id) '
+                    "SELECT 'Python', '', '2025-09-01', '2025-12-01', 'https://example.com/dup', '', o.id, d.id "
+                    'FROM organization o, difficulty d'
+                )
+            )
+    with pytest.raises(DBAPIError, match='course urls are duplicated: https://example.com/dup'):
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
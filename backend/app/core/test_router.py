@@ -1,15 +1,43 @@
+import base64
+import json
+from dataclasses import replace
 from datetime import date
 
+import brotli
 import pytest
 import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
 from psycopg import Connection
 from pytest_postgresql import factories
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine
-from sqlmodel import SQLModel, select
+from sqlmodel import SQLModel, delete, select
 from sqlmodel.ext.asyncio.session import AsyncSession as SQLModelAsyncSession
 
-from app.models import Course, Subject, Organization, get_session, Difficulty, Grade, CourseSubjectLink, CourseGradeLink
+from app.core.cache import (
+    CachedResponse,
+    ResponseCache,
+    check_course_tables,
+    course_cache,
+    course_tables_version,
+    facet_cache,
+    make_etag,
+)
+from app.core.snapshot import reference_snapshot
+from app import metrics
+from app.metrics import request_queries, serialization_duration
+from app.testing import assert_max_queries
+from app.models import (
+    CourseRead,
+    Course,
+    Subject,
+    Organization,
+    get_session,
+    Difficulty,
+    Grade,
+    CourseSubjectLink,
+    CourseGradeLink,
+)
 from main import api
 
 postgresql_proc = factories.postgresql_proc(dbname='test_db')
@@ -137,11 +165,27 @@ async def client_fixture(session: SQLModelAsyncSession):
         return session
 
     api.dependency_overrides[get_session] = get_session_override
+    reference_snapshot.invalidate()
+    # what the startup check does on the primary
+    version = await course_tables_version(session)
+    course_cache.invalidate(version)
+    facet_cache.invalidate(version)
     async with AsyncClient(transport=ASGITransport(api), base_url='http://test', follow_redirects=True) as ac:
         yield ac
     api.dependency_overrides.clear()
 
 
+@pytest.mark.asyncio
+async def test_get_courses_records_metrics(client: AsyncClient):
+    before = request_queries.series.get(('/courses/',))
+    count = before.count if before else 0
+    response = await client.get('/courses/')
+    assert response.status_code == 200
+    assert request_queries.series['/courses/',].count == count + 1
+    assert request_queries.series['/courses/',].sum > 0
+    assert serialization_duration.series['/courses/',].sum > 0
+
+
 @pytest.mark.asyncio
 async def test_get_courses(client: AsyncClient):
     response = await client.get('/courses/')
@@ -173,7 +217,7 @@ async def test_get_course_not_found(client: AsyncClient):
 
 @pytest.mark.asyncio
 async def test_get_subjects(client: AsyncClient):
-    response = await client.get('/subjects/')
+    response = await client.get('/subjects/', params={'inline_icons': True})
     assert response.status_code == 200
     data = response.json()
     assert len(data) == 3
@@ -198,7 +242,7 @@ async def test_get_subjects(client: AsyncClient):
 @pytest.mark.asyncio
 async def test_get_subject_success(client: AsyncClient, session: SQLModelAsyncSession):
     subject = (await session.exec(select(Subject).where(Subject.type == 'ai'))).first()
-    response = await client.get(f'/subjects/{subject.id}/')
+    response = await client.get(f'/subjects/{subject.id}/', params={'inline_icons': True})
     assert response.status_code == 200
     data = response.json()
     assert data['type'] == 'ai'
@@ -259,3 +303,606 @@ async def test_subject_courses_relation(client: AsyncClient, session: SQLModelAs
     data = response.json()
 
     assert 'courses' not in data
+
+
+@pytest.mark.asyncio
+async def test_get_courses_filter_by_subjects(client: AsyncClient):
+    response = await client.get('/courses/', params={'subjects': ['ai', 'robotics']})
+    assert response.status_code == 200
+    assert [course['title'] for course in response.json()] == ['Основы машинного обучения и нейронных сетей']
+
+    response = await client.get('/courses/', params={'subjects': 'programming'})
+    assert len(response.json()) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_courses_filter_by_grades_difficulties_organizations(client: AsyncClient):
+    response = await client.get('/courses/', params={'grades': [7, 11], 'difficulties': 'beginner'})
+    assert len(response.json()) == 2
+
+    response = await client.get('/courses/', params={'grades': 11})
+    assert response.json() == []
+
+    response = await client.get('/courses/', params={'organizations': 'Science School'})
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_get_courses_filter_by_dates(client: AsyncClient):
+    response = await client.get('/courses/', params={'start_date': '2023-09-15'})
+    assert [course['title'] for course in response.json()] == ['Python Fundamentals']
+
+    response = await client.get('/courses/', params={'end_date': '2024-02-01'})
+    assert [course['title'] for course in response.json()] == ['Основы машинного обучения и нейронных сетей']
+
+    response = await client.get('/courses/', params={'start_date': 'not-a-date'})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_courses_pagination(client: AsyncClient):
+    response = await client.get('/courses/', params={'limit': 1})
+    assert response.status_code == 200
+    assert [course['title'] for course in response.json()] == ['Основы машинного обучения и нейронных сетей']
+    cursor = response.headers['X-Next-Cursor']
+
+    response = await client.get('/courses/', params={'limit': 1, 'cursor': cursor})
+    assert [course['title'] for course in response.json()] == ['Python Fundamentals']
+    assert 'X-Next-Cursor' not in response.headers
+
+    response = await client.get('/courses/')
+    assert len(response.json()) == 2
+    assert 'X-Next-Cursor' not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_get_courses_invalid_cursor(client: AsyncClient):
+    response = await client.get('/courses/', params={'cursor': 'garbage'})
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Invalid cursor'
+
+    response = await client.get('/courses/', params={'limit': 0})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'raw',
+    [
+        '["2020-01-01", 1e400]',
+        '["2020-01-01", 1.5]',
+        '["2020-01-01", true]',
+        '["2020-01-01", 99999999999]',
+        '["2020-01-01", -1]',
+        '[20200101, 1]',
+        '{"start_date": 1, "id": 2}',
+        '[' * 5000 + ']' * 5000,
+    ],
+)
+async def test_get_courses_crafted_cursor(client: AsyncClient, raw: str):
+    cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+    response = await client.get('/courses/', params={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Invalid cursor'
+
+
+@pytest.mark.asyncio
+async def test_reference_snapshot_serves_from_memory(client: AsyncClient, session: SQLModelAsyncSession):
+    response = await client.get('/organizations/')
+    assert len(response.json()) == 2
+
+    org = Organization(name='Robotics Club')
+    session.add(org)
+    await session.commit()
+    response = await client.get('/organizations/')
+    assert len(response.json()) == 2
+    response = await client.get(f'/organizations/{org.id}/')
+    assert response.status_code == 404
+
+    reference_snapshot.invalidate()
+    response = await client.get('/organizations/')
+    assert len(response.json()) == 3
+    response = await client.get(f'/organizations/{org.id}/')
+    assert response.json()['name'] == 'Robotics Club'
+
+
+@pytest.mark.asyncio
+async def test_get_difficulties_and_grades(client: AsyncClient):
+    response = await client.get('/difficulties/')
+    assert [d['type'] for d in response.json()] == ['beginner']
+    difficulty_id = response.json()[0]['id']
+    response = await client.get(f'/difficulties/{difficulty_id}/')
+    assert response.json()['label'] == 'начальный'
+
+    response = await client.get('/grades/')
+    assert [g['grade'] for g in response.json()] == [7, 8, 9]
+    response = await client.get('/grades/999/')
+    assert response.status_code == 404
+    assert response.json()['detail'] == 'Grade not found'
+
+
+@pytest.mark.asyncio
+async def test_get_courses_serves_cached_catalog(client: AsyncClient, session: SQLModelAsyncSession):
+    response = await client.get('/courses/')
+    assert len(response.json()) == 2
+
+    course = (await session.exec(select(Course))).first()
+    session.add(
+        Course(
+            title='Robotics 101',
+            description='Build a robot',
+            start_date=date(2024, 9, 1),
+            end_date=date(2025, 5, 1),
+            url='https://example.com/robotics',
+            image_url='https://placehold.co/100x100',
+            organization_id=course.organization_id,
+            difficulty_id=course.difficulty_id,
+        )
+    )
+    await session.commit()
+    response = await client.get('/courses/')
+    assert len(response.json()) == 2
+    # filtered requests always go to the database
+    response = await client.get('/courses/', params={'start_date': '2024-01-01'})
+    assert [course['title'] for course in response.json()] == ['Robotics 101']
+
+    course_cache.invalidate()
+    response = await client.get('/courses/')
+    assert len(response.json()) == 3
+
+
+@pytest.mark.asyncio
+async def test_course_tables_version(session: SQLModelAsyncSession):
+    version = await course_tables_version(session)
+    course = (await session.exec(select(Course))).first()
+    course.title = 'Machine learning'
+    session.add(course)
+    await session.commit()
+    changed = await course_tables_version(session)
+    assert changed != version
+
+    # a statement that matches no rows is not a change
+    await session.exec(delete(Course).where(Course.id == -1))
+    await session.commit()
+    assert await course_tables_version(session) == changed
+
+    subject = (await session.exec(select(Subject))).first()
+    subject.color = '#000000'
+    session.add(subject)
+    await session.commit()
+    assert await course_tables_version(session) != changed
+
+
+def test_response_cache_drops_responses_built_for_an_old_version():
+    cache = ResponseCache()
+    cache.invalidate('1')
+    cache.put('page', CachedResponse(b'[]'), '1')
+    assert cache.get('page') is not None
+
+    # read before the invalidation, stored after it
+    cache.invalidate('2')
+    cache.put('page', CachedResponse(b'[]'), '1')
+    assert cache.get('page') is None
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.invalidate('1')
+    cache.put('a', CachedResponse(b'a'), '1')
+    cache.put('b', CachedResponse(b'b'), '1')
+    assert cache.get('a') is not None
+    cache.put('c', CachedResponse(b'c'), '1')
+    assert list(cache.entries) == ['a', 'c']
+
+
+@pytest.mark.asyncio
+async def test_lagging_replica_does_not_fill_the_cache(client: AsyncClient, session: SQLModelAsyncSession):
+    # the primary is already at a version the node serving this request has not replayed
+    course_cache.invalidate('ahead')
+    response = await client.get('/courses/')
+    assert len(response.json()) == 2
+    assert course_cache.entries == {}
+    # tagged with the version the data was read at, so a client never holds old data under the new version
+    assert response.headers['ETag'] == make_etag(await course_tables_version(session), [])
+
+
+@pytest.mark.asyncio
+async def test_get_courses_compressed_variants(client: AsyncClient):
+    response = await client.get('/courses/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert len(response.json()) == 2
+
+    # served from the variant compressed when the page was cached
+    async with client.stream('GET', '/courses/', headers={'Accept-Encoding': 'gzip, br'}) as response:
+        raw = b''.join([chunk async for chunk in response.aiter_raw()])
+    assert response.headers['Content-Encoding'] == 'br'
+    assert [raw] == [entry.br for entry in course_cache.entries.values()]
+    assert len(json.loads(brotli.decompress(raw))) == 2
+
+    response = await client.get('/courses/', headers={'Accept-Encoding': 'identity, gzip;q=0'})
+    assert 'Content-Encoding' not in response.headers
+    assert len(response.json()) == 2
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_reference_lists(client: AsyncClient, session: SQLModelAsyncSession):
+    response = await client.get('/subjects/')
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'public, max-age=30'
+
+    response = await client.get('/subjects/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.content == b''
+    assert response.headers['ETag'] == etag
+
+    subject = (await session.exec(select(Subject).where(Subject.type == 'ai'))).first()
+    response = await client.get(f'/subjects/{subject.id}/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    reference_snapshot.invalidate()
+    response = await client.get('/subjects/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    subject.label = 'ИИ'
+    session.add(subject)
+    await session.commit()
+    reference_snapshot.invalidate()
+    response = await client.get('/subjects/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_courses(client: AsyncClient, session: SQLModelAsyncSession):
+    response = await client.get('/courses/', params={'subjects': 'ai'})
+    etag = response.headers['ETag']
+    response = await client.get('/courses/', params={'subjects': 'ai'}, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    response = await client.get('/courses/', params={'subjects': 'programming'}, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+    response = await client.get('/courses/')
+    etag = response.headers['ETag']
+    response = await client.get('/courses/', headers={'If-None-Match': f'"other", {etag}'})
+    assert response.status_code == 304
+
+    course = (await session.exec(select(Course))).first()
+    response = await client.get(f'/courses/{course.id}/')
+    assert response.json()['title'] == course.title
+    etag = response.headers['ETag']
+    response = await client.get(f'/courses/{course.id}/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    course.title = 'Machine learning'
+    session.add(course)
+    await session.commit()
+    course_cache.invalidate()
+    response = await client.get(f'/courses/{course.id}/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json()['title'] == 'Machine learning'
+
+
+@pytest.mark.asyncio
+async def test_get_catalog(client: AsyncClient, session: SQLModelAsyncSession):
+    response = await client.get('/catalog/')
+    assert response.status_code == 200
+    data = response.json()
+    assert sorted(s['type'] for s in data['subjects']) == ['ai', 'programming', 'robotics']
+    assert [d['type'] for d in data['difficulties']] == ['beginner']
+    assert [g['grade'] for g in data['grades']] == [7, 8, 9]
+    assert len(data['organizations']) == 2
+    assert data['next_cursor'] is None
+
+    subjects = {s['id']: s['type'] for s in data['subjects']}
+    ai = data['courses'][0]
+    assert ai['title'] == 'Основы машинного обучения и нейронных сетей'
+    assert sorted(subjects[i] for i in ai['subject_ids']) == ['ai', 'programming']
+    assert ai['grades'] == [7, 8, 9]
+    assert ai['difficulty_id'] == data['difficulties'][0]['id']
+    assert 'subjects' not in ai
+
+    response = await client.get('/catalog/', params={'limit': 1, 'subjects': 'programming'})
+    data = response.json()
+    assert [course['title'] for course in data['courses']] == ['Основы машинного обучения и нейронных сетей']
+    assert data['next_cursor'] is not None
+
+    response = await client.get('/catalog/', params={'subjects': 'robotics'})
+    assert response.json()['courses'] == []
+
+
+@pytest.mark.asyncio
+async def test_search_courses(client: AsyncClient):
+    response = await client.get('/courses/search/', params={'q': 'нейронная сеть'})
+    assert response.status_code == 200
+    assert [course['title'] for course in response.json()] == ['Основы машинного обучения и нейронных сетей']
+
+    response = await client.get('/courses/search/', params={'q': 'python'})
+    assert [course['title'] for course in response.json()] == ['Python Fundamentals']
+
+    # a title match ranks above a description match
+    response = await client.get('/courses/search/', params={'q': 'python or яндекс'})
+    assert [course['title'] for course in response.json()] == [
+        'Python Fundamentals',
+        'Основы машинного обучения и нейронных сетей',
+    ]
+
+    response = await client.get('/courses/search/', params={'q': 'python', 'subjects': 'ai'})
+    assert response.json() == []
+
+    response = await client.get('/courses/search/')
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_course_read_model_follows_writes(client: AsyncClient, session: SQLModelAsyncSession):
+    org = (await session.exec(select(Organization).where(Organization.name == 'Coding Academy'))).first()
+    org.name = 'Coding Academy Pro'
+    session.add(org)
+    ai_course = (await session.exec(select(Course).where(Course.url == 'https://practicum.yandex.ru/'))).first()
+    link = (await session.exec(select(CourseSubjectLink).where(CourseSubjectLink.course_id == ai_course.id))).first()
+    await session.delete(link)
+    await session.commit()
+
+    response = await client.get(f'/courses/{ai_course.id}/')
+    assert response.json()['organization'] == 'Coding Academy Pro'
+    assert response.json()['subjects'] == ['programming']
+
+    python_course = (await session.exec(select(Course).where(Course.url == 'https://example.com/python'))).first()
+    for model in (CourseSubjectLink, CourseGradeLink):
+        for link in (await session.exec(select(model).where(model.course_id == python_course.id))).all():
+            await session.delete(link)
+    await session.flush()
+    await session.delete(python_course)
+    await session.commit()
+    assert (await session.exec(select(CourseRead).where(CourseRead.id == python_course.id))).first() is None
+
+
+@pytest.mark.asyncio
+async def test_course_read_model_backfill(session: SQLModelAsyncSession):
+    await session.exec(delete(CourseRead))
+    await session.commit()
+
+    await session.run_sync(lambda sync_session: SQLModel.metadata.create_all(sync_session.connection()))
+    await session.commit()
+    rows = (await session.exec(select(CourseRead).order_by(CourseRead.start_date))).all()
+    assert [row.title for row in rows] == ['Основы машинного обучения и нейронных сетей', 'Python Fundamentals']
+    assert rows[0].grades == [7, 8, 9]
+    assert rows[0].subjects == ['ai', 'programming']
+
+
+@pytest.mark.asyncio
+async def test_get_courses_batch(client: AsyncClient, session: SQLModelAsyncSession):
+    courses = (await session.exec(select(Course).order_by(Course.id))).all()
+    ids = f'{courses[1].id},999,{courses[0].id},{courses[1].id}'
+    response = await client.get('/courses/batch/', params={'ids': ids})
+    assert response.status_code == 200
+    data = response.json()
+    assert [course['title'] for course in data['items']] == [
+        'Python Fundamentals',
+        'Основы машинного обучения и нейронных сетей',
+    ]
+    assert data['items'][1]['subjects'] == ['ai', 'programming']
+    assert data['missing'] == [999]
+
+    response = await client.get('/courses/batch/', params={'ids': '1,abc'})
+    assert response.status_code == 422
+    response = await client.get('/courses/batch/', params={'ids': ','.join(map(str, range(1, 502)))})
+    assert response.status_code == 400
+    # does not fit the int4 id column
+    response = await client.get('/courses/batch/', params={'ids': '1,99999999999'})
+    assert response.status_code == 400
+    response = await client.get('/courses/batch/', params={'ids': str(2**31 - 1)})
+    assert response.json()['missing'] == [2**31 - 1]
+
+
+@pytest.mark.asyncio
+async def test_get_reference_batches(client: AsyncClient, session: SQLModelAsyncSession):
+    subjects = (await session.exec(select(Subject).order_by(Subject.id))).all()
+    response = await client.get('/subjects/batch/', params={'ids': f'{subjects[2].id},{subjects[0].id},404'})
+    data = response.json()
+    assert [s['type'] for s in data['items']] == ['programming', 'ai']
+    assert data['items'][1]['additional_description']
+    assert data['missing'] == [404]
+
+    response = await client.get('/grades/batch/', params={'ids': '404'})
+    assert response.json() == {'items': [], 'missing': [404]}
+
+    for collection in ('difficulties', 'organizations'):
+        response = await client.get(f'/{collection}/batch/', params={'ids': '1'})
+        assert response.status_code == 200
+        assert response.json()['missing'] == []
+        response = await client.get(f'/{collection}/batch/', params={'ids': '99999999999'})
+        assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_icons_served_by_hash(client: AsyncClient, session: SQLModelAsyncSession):
+    response = await client.get('/subjects/')
+    ai = next(s for s in response.json() if s['type'] == 'ai')
+    assert 'icon' not in ai
+    assert ai['icon_url'].startswith('/icons/')
+
+    response = await client.get(ai['icon_url'])
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'image/svg+xml'
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    subject = (await session.exec(select(Subject).where(Subject.type == 'ai'))).first()
+    assert response.text == f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24">{subject.icon}</svg>'
+
+    response = await client.get(ai['icon_url'], headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+    response = await client.get('/icons/0123456789abcdef.svg')
+    assert response.status_code == 404
+    assert response.json()['detail'] == 'Icon not found'
+
+    response = await client.get(f'/subjects/{subject.id}/')
+    assert 'icon' not in response.json()
+    response = await client.get('/difficulties/batch/', params={'ids': '1', 'inline_icons': True})
+    assert response.json()['items'][0]['icon'].startswith('<path')
+
+    response = await client.get('/catalog/')
+    assert all('icon' not in s and s['icon_url'] for s in response.json()['subjects'])
+    response = await client.get('/catalog/', params={'inline_icons': True})
+    assert all(s['icon'] for s in response.json()['subjects'])
+
+
+@pytest.mark.asyncio
+async def test_search_vector_is_added_to_existing_tables(client: AsyncClient, session: SQLModelAsyncSession):
+    # a database from before full text search
+    async with session.bind.begin() as conn:
+        await conn.execute(text('ALTER TABLE course DROP COLUMN search_vector'))
+        await conn.run_sync(SQLModel.metadata.create_all)
+        indexes = await conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = 'course'"))
+        assert 'ix_course_search_vector' in indexes.scalars().all()
+    response = await client.get('/courses/search/', params={'q': 'python'})
+    assert [course['title'] for course in response.json()] == ['Python Fundamentals']
+
+
+@pytest.mark.asyncio
+async def test_catalog_version_reloads_reference_snapshot(
+    client: AsyncClient, session: SQLModelAsyncSession, monkeypatch
+):
+    monkeypatch.setattr('app.core.cache.engine', session.bind)
+    await client.get('/organizations/')
+    version = course_cache.version
+
+    # like the importer, which creates organizations on the fly
+    session.add(Organization(name='Imported Academy'))
+    await session.commit()
+    await check_course_tables()
+    assert course_cache.version != version
+    response = await client.get('/organizations/')
+    assert 'Imported Academy' in [o['name'] for o in response.json()]
+
+
+@pytest.mark.asyncio
+async def test_catalog_follows_reference_snapshot(client: AsyncClient, session: SQLModelAsyncSession):
+    response = await client.get('/catalog/')
+    etag = response.headers['ETag']
+
+    subject = (await session.exec(select(Subject).where(Subject.type == 'ai'))).first()
+    subject.label = 'ИИ'
+    session.add(subject)
+    await session.commit()
+    # the snapshot has not reloaded yet
+    response = await client.get('/catalog/')
+    assert 'ИИ' not in [s['label'] for s in response.json()['subjects']]
+
+    # the course cache keeps its version, the snapshot alone has to change the response and its ETag
+    reference_snapshot.invalidate()
+    response = await client.get('/catalog/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert 'ИИ' in [s['label'] for s in response.json()['subjects']]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'url',
+    [
+        '/courses/',
+        '/courses/?subjects=ai&grades=9',
+        '/courses/search/?q=python',
+        '/courses/batch/?ids=1,2,3',
+        '/courses/facets/?grades=9',
+        '/courses/1',
+        '/catalog/',
+        '/subjects/',
+        '/grades/batch/?ids=9,10',
+    ],
+)
+async def test_query_count(client: AsyncClient, url: str, monkeypatch):
+    monkeypatch.setattr(metrics, 'settings', replace(metrics.settings, query_count_header=True))
+    # loads the reference snapshot, which is not part of any single request's budget
+    await client.get('/subjects/')
+    course_cache.invalidate()
+    facet_cache.invalidate()
+    with assert_max_queries(2):
+        response = await client.get(url)
+    assert response.status_code == 200
+    assert int(response.headers['X-Query-Count']) <= 2
+
+
+@pytest.mark.asyncio
+async def test_query_count_header_is_off_by_default(client: AsyncClient):
+    response = await client.get('/courses/')
+    assert 'X-Query-Count' not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_assert_max_queries_fails_when_exceeded(client: AsyncClient):
+    course_cache.invalidate()
+    with pytest.raises(AssertionError, match='expected at most 0'):
+        with assert_max_queries(0):
+            await client.get('/courses/')
+
+
+@pytest.mark.asyncio
+async def test_export_courses(client: AsyncClient):
+    response = await client.get('/courses/export/')
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    lines = response.text.splitlines()
+    assert [json.loads(line)['title'] for line in lines] == [
+        'Основы машинного обучения и нейронных сетей',
+        'Python Fundamentals',
+    ]
+    assert json.loads(lines[0])['subjects'] == ['ai', 'programming']
+
+    response = await client.get('/courses/export/', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_export_courses_filtered(client: AsyncClient):
+    response = await client.get('/courses/export/', params={'subjects': 'ai'})
+    assert response.status_code == 200
+    assert [json.loads(line)['title'] for line in response.text.splitlines()] == [
+        'Основы машинного обучения и нейронных сетей'
+    ]
+    response = await client.get('/courses/export/', params={'subjects': 'cooking'})
+    assert response.text == ''
+
+
+@pytest.mark.asyncio
+async def test_get_course_facets(client: AsyncClient):
+    response = await client.get('/courses/facets/')
+    assert response.status_code == 200
+    assert response.json() == {
+        'total': 2,
+        'subjects': {'ai': 1, 'programming': 2},
+        'grades': {'7': 2, '8': 2, '9': 2},
+        'difficulties': {'beginner': 2},
+        'organizations': {'Coding Academy': 2},
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_course_facets_filtered(client: AsyncClient):
+    response = await client.get('/courses/facets/', params={'subjects': 'ai'})
+    facets = response.json()
+    assert facets['total'] == 1
+    # a facet is counted without its own filter, so the other subjects still show what choosing them would add
+    assert facets['subjects'] == {'ai': 1, 'programming': 2}
+    assert facets['organizations'] == {'Coding Academy': 1}
+
+    response = await client.get('/courses/facets/', params={'subjects': 'robotics'})
+    facets = response.json()
+    assert facets['total'] == 0
+    assert facets['subjects'] == {'ai': 1, 'programming': 2}
+    assert facets['grades'] == {'7': 0, '8': 0, '9': 0}
+
+    etag = response.headers['ETag']
+    response = await client.get('/courses/facets/', params=[('subjects', 'robotics'), ('subjects', 'robotics')])
+    assert response.headers['ETag'] == etag
+
+
+@pytest.mark.asyncio
+async def test_course_facets_do_not_evict_course_pages(client: AsyncClient):
+    await client.get('/courses/')
+    for grade in range(1, 12):
+        await client.get('/courses/facets/', params={'grades': grade})
+    assert len(course_cache.entries) == 1
+    assert len(facet_cache.entries) == 11
@@ -0,0 +1,272 @@
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.settings import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    query_seconds: float = 0.0
+    serialization_seconds: float = 0.0
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar('current_request', default=None)
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [
+        '%s="%s"' % (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+@dataclass
+class HistogramSeries:
+    counts: List[int]
+    sum: float = 0.0
+    count: int = 0
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.series: Dict[Tuple[str, ...], HistogramSeries] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = HistogramSeries(counts=[0] * len(self.buckets))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series.counts[i] += 1
+                break
+        series.sum += value
+        series.count += 1
+
+    def quantile(self, q: float, *labels: str) -> Optional[float]:
+        # the same linear interpolation inside a bucket as histogram_quantile() in PromQL
+        series = self.series.get(labels)
+        if not series or not series.count:
+            return None
+        rank = q * series.count
+        seen, lower = 0, 0.0
+        for bound, count in zip(self.buckets, series.counts):
+            if count and seen + count >= rank:
+                if bound == math.inf:
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return lower
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series.counts):
+                cumulative += count
+                le = 'le="%s"' % format_value(bound)
+                lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(series.sum)}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {series.count}')
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        for labels, value in self.values.items():
+            lines.append(f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}')
+        return lines
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds',
+    'Time from receiving a request to sending the last byte.',
+    ['method', 'route', 'status'],
+)
+requests_in_progress = Gauge('http_requests_in_progress', 'Requests currently being handled.', ['method'])
+request_queries = Histogram(
+    'db_queries_per_request', 'SQL statements issued while handling a request.', ['route'], QUERY_COUNT_BUCKETS
+)
+request_query_duration = Histogram(
+    'db_query_duration_seconds_per_request', 'Time spent in SQL statements while handling a request.', ['route']
+)
+serialization_duration = Histogram(
+    'response_serialization_duration_seconds', 'Time spent encoding response models.', ['route']
+)
+REQUEST_METRICS = (
+    request_duration,
+    requests_in_progress,
+    request_queries,
+    request_query_duration,
+    serialization_duration,
+)
+
+
+# the pool stats that only ever grow, everything else is a gauge
+POOL_COUNTERS = {
+    'checkouts': 'db_pool_checkouts_total',
+    'timeouts': 'db_pool_timeouts_total',
+    'wait_seconds_total': 'db_pool_wait_seconds_total',
+}
+
+
+def render_pool_metrics(pools: Dict[str, dict]) -> List[str]:
+    lines = []
+    keys = next(iter(pools.values()), {}).keys()
+    for key in keys:
+        name, kind = (POOL_COUNTERS[key], 'counter') if key in POOL_COUNTERS else (f'db_pool_{key}', 'gauge')
+        lines += [f'# HELP {name} Connection pool {key.replace("_", " ")}.', f'# TYPE {name} {kind}']
+        for pool, stats in pools.items():
+            lines.append(f'{name}{format_labels(["pool"], [pool])} {format_value(stats[key])}')
+    return lines
+
+
+def render_metrics(pools: Dict[str, dict]) -> str:
+    lines = []
+    for metric in REQUEST_METRICS:
+        lines += metric.render()
+    lines += render_pool_metrics(pools)
+    return '\n'.join(lines) + '\n'
+
+
+def latency_summary(target: float) -> List[dict]:
+    # statuses are merged, the target is about how long users wait whatever the outcome
+    merged = Histogram(request_duration.name, request_duration.documentation, ['method', 'route'])
+    for (method, route, _), series in request_duration.series.items():
+        total = merged.series.setdefault((method, route), HistogramSeries(counts=[0] * len(merged.buckets)))
+        total.counts = [a + b for a, b in zip(total.counts, series.counts)]
+        total.sum += series.sum
+        total.count += series.count
+    summary = []
+    for method, route in sorted(merged.series):
+        p95 = merged.quantile(0.95, method, route)
+        summary.append(
+            {
+                'method': method,
+                'route': route,
+                'count': merged.series[method, route].count,
+                'p50': merged.quantile(0.5, method, route),
+                'p95': p95,
+                'p99': merged.quantile(0.99, method, route),
+                'target': target,
+                'within_target': p95 <= target,
+            }
+        )
+    return summary
+
+
+@contextmanager
+def track_serialization() -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_request.get()
+        if stats is not None:
+            stats.serialization_seconds += time.perf_counter() - start
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.query_seconds += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def handle_error(context):
+    if context.connection is not None and context.connection.info.get('query_start'):
+        context.connection.info['query_start'].pop()
+
+
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        method = scope['method']
+        status = 500
+        stats = RequestStats()
+        token = current_request.set(stats)
+        query_count_header = settings.query_count_header
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if query_count_header:
+                    # statements issued while a streaming body is sent are not in here
+                    MutableHeaders(scope=message)[QUERY_COUNT_HEADER] = str(stats.queries)
+            await send(message)
+
+        requests_in_progress.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            requests_in_progress.dec(method)
+            current_request.reset(token)
+            # the route template keeps ids out of the label values
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            request_duration.observe(elapsed, method, route, str(status))
+            request_queries.observe(stats.queries, route)
+            request_query_duration.observe(stats.query_seconds, route)
+            serialization_duration.observe(stats.serialization_seconds, route)
@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.metrics import latency_summary, render_metrics
+from app.models import engine, replicas
+from app.settings import settings
+
+monitoring_router = APIRouter()
+
+
+@monitoring_router.get('/metrics', response_class=PlainTextResponse)
+async def get_metrics():
+    pools = {'primary': engine.pool.status_dict()}
+    for replica in replicas.replicas:
+        pools[f'{replica.engine.url.host}:{replica.engine.url.port}'] = replica.engine.pool.status_dict()
+    return PlainTextResponse(render_metrics(pools), media_type='text/plain; version=0.0.4')
+
+
+@monitoring_router.get('/stats/latency/')
+async def get_latency_stats():
+    return latency_summary(settings.latency_target)
+
+
+@monitoring_router.get('/stats/pool/')
+async def get_pool_stats():
+    return engine.pool.status_dict()
+
+
+@monitoring_router.get('/stats/replicas/')
+async def get_replica_stats():
+    return [replica.status_dict() for replica in replicas.replicas]
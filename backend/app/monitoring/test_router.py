@@ -0,0 +1,42 @@
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+
+from main import api
+
+
+@pytest_asyncio.fixture(name='client')
+async def client_fixture():
+    async with AsyncClient(transport=ASGITransport(api), base_url='http://test', follow_redirects=True) as ac:
+        yield ac
+
+
+@pytest.mark.asyncio
+async def test_get_pool_stats(client: AsyncClient):
+    response = await client.get('/stats/pool/')
+    assert response.status_code == 200
+    data = response.json()
+    assert data['checked_out'] == 0
+    assert {'size', 'overflow', 'max_overflow', 'timeouts', 'wait_seconds_total', 'wait_seconds_max'} <= data.keys()
+
+
+@pytest.mark.asyncio
+async def test_get_metrics(client: AsyncClient):
+    await client.get('/stats/pool/')
+    response = await client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    assert 'http_request_duration_seconds_count{method="GET",route="/stats/pool/",status="200"}' in response.text
+    assert 'db_pool_size{pool="primary"}' in response.text
+    assert 'db_pool_timeouts_total{pool="primary"}' in response.text
+
+
+@pytest.mark.asyncio
+async def test_get_latency_stats(client: AsyncClient):
+    await client.get('/stats/pool/')
+    response = await client.get('/stats/latency/')
+    assert response.status_code == 200
+    stats = next(item for item in response.json() if item['route'] == '/stats/pool/')
+    assert stats['count'] >= 1
+    assert stats['target'] == 0.5
+    assert stats['within_target'] is True
@@ -0,0 +1,84 @@
+import asyncio
+import itertools
+import logging
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# seconds the replica is behind the primary; an idle replica that has replayed everything it received is not behind,
+# but only while it is still receiving: NULL when no WAL receiver is streaming, whatever has been replayed.
+# The receiver's status is visible to members of pg_monitor only, for other roles a running receiver counts
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT FROM pg_stat_wal_receiver WHERE coalesce(status, 'streaming') = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Replica:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def status_dict(self) -> dict:
+        return {
+            'host': self.engine.url.host,
+            'port': self.engine.url.port,
+            'healthy': self.healthy,
+            'lag_seconds': self.lag,
+            'error': self.error,
+            'pool': self.engine.pool.status_dict(),
+        }
+
+
+class ReplicaSet:
+    """Read replicas that are handed out round-robin while they are reachable and not too far behind."""
+
+    def __init__(self, engines: List[AsyncEngine], max_lag: float, check_timeout: float = 2):
+        self.replicas = [Replica(engine) for engine in engines]
+        self.max_lag = max_lag
+        self.check_timeout = check_timeout
+        self._counter = itertools.count()
+
+    def pick(self) -> Optional[AsyncEngine]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)].engine
+
+    async def check_replica(self, replica: Replica) -> None:
+        try:
+            async with asyncio.timeout(self.check_timeout):
+                async with replica.engine.connect() as conn:
+                    lag = (await conn.execute(REPLICA_LAG_QUERY)).scalar_one()
+        except Exception as e:
+            if replica.healthy:
+                logger.warning('Replica %s is down: %r', replica.engine.url.host, e)
+            replica.healthy, replica.lag, replica.error = False, None, repr(e)
+            return
+        if lag is None:
+            if replica.healthy:
+                logger.warning('Replica %s is not receiving WAL', replica.engine.url.host)
+            replica.healthy, replica.lag, replica.error = False, None, 'WAL receiver is not streaming'
+            return
+        replica.lag = float(lag)
+        replica.healthy = replica.lag <= self.max_lag
+        replica.error = None if replica.healthy else f'lag {replica.lag:.1f}s is over {self.max_lag}s'
+
+    async def check(self) -> None:
+        await asyncio.gather(*(self.check_replica(replica) for replica in self.replicas))
+
+    async def monitor(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.check()
@@ -1,5 +1,7 @@
 from fastapi import APIRouter
 from app.core.router import core_router
+from app.monitoring.router import monitoring_router
 
 router = APIRouter()
 router.include_router(core_router)
+router.include_router(monitoring_router)
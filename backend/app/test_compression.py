@@ -0,0 +1,119 @@
+import gzip
+
+import brotli
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from httpx import ASGITransport, AsyncClient
+
+from app.compression import CompressionMiddleware, accepted_encodings
+
+BODY = b'{"title": "course"}' * 100
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get('/large')
+    async def large():
+        return Response(content=BODY, media_type='application/json')
+
+    @app.get('/small')
+    async def small():
+        return Response(content=b'{}', media_type='application/json')
+
+    @app.get('/precompressed')
+    async def precompressed():
+        return Response(
+            content=gzip.compress(BODY), media_type='application/json', headers={'Content-Encoding': 'gzip'}
+        )
+
+    @app.get('/stream')
+    async def stream():
+        async def chunks():
+            for _ in range(10):
+                yield BODY
+
+        return StreamingResponse(chunks(), media_type='application/x-ndjson')
+
+    return app
+
+
+@pytest_asyncio.fixture(name='client')
+async def client_fixture():
+    async with AsyncClient(transport=ASGITransport(build_app()), base_url='http://test') as ac:
+        yield ac
+
+
+async def get_raw(client: AsyncClient, url: str, accept_encoding: str):
+    # the body as sent, before httpx decodes it
+    async with client.stream('GET', url, headers={'Accept-Encoding': accept_encoding}) as response:
+        return response, b''.join([chunk async for chunk in response.aiter_raw()])
+
+
+@pytest.mark.asyncio
+async def test_compresses_large_responses(client: AsyncClient):
+    response = await client.get('/large', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['vary']
+    assert int(response.headers['content-length']) < len(BODY)
+    assert response.content == BODY
+
+
+@pytest.mark.asyncio
+async def test_skips_small_responses(client: AsyncClient):
+    response = await client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+    assert response.content == b'{}'
+
+
+@pytest.mark.asyncio
+async def test_respects_accept_encoding(client: AsyncClient):
+    response = await client.get('/large', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+    assert 'content-encoding' not in response.headers
+    assert response.content == BODY
+
+
+@pytest.mark.asyncio
+async def test_leaves_precompressed_responses_alone(client: AsyncClient):
+    response = await client.get('/precompressed', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.content == BODY
+
+
+@pytest.mark.asyncio
+async def test_compresses_streaming_responses(client: AsyncClient):
+    response = await client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert 'content-length' not in response.headers
+    assert response.content == BODY * 10
+
+
+@pytest.mark.asyncio
+async def test_prefers_brotli(client: AsyncClient):
+    response, raw = await get_raw(client, '/large', 'gzip, br')
+    assert response.headers['content-encoding'] == 'br'
+    assert 'Accept-Encoding' in response.headers['vary']
+    assert int(response.headers['content-length']) == len(raw) < len(BODY)
+    assert brotli.decompress(raw) == BODY
+
+
+@pytest.mark.asyncio
+async def test_compresses_streaming_responses_with_brotli(client: AsyncClient):
+    response, raw = await get_raw(client, '/stream', 'br')
+    assert response.headers['content-encoding'] == 'br'
+    assert 'content-length' not in response.headers
+    assert brotli.decompress(raw) == BODY * 10
+
+
+@pytest.mark.asyncio
+async def test_leaves_precompressed_responses_alone_for_brotli_clients(client: AsyncClient):
+    response, raw = await get_raw(client, '/precompressed', 'br, gzip')
+    assert response.headers['content-encoding'] == 'gzip'
+    assert gzip.decompress(raw) == BODY
+
+
+def test_accepted_encodings():
+    assert accepted_encodings('gzip, deflate, br;q=0') == {'gzip', 'deflate'}
@@ -0,0 +1,43 @@
+from app.metrics import Histogram, render_pool_metrics
+
+
+def test_histogram_quantile():
+    histogram = Histogram('latency', 'Latency.', ['route'], buckets=(0.1, 0.5, 1.0))
+    for _ in range(90):
+        histogram.observe(0.05, '/courses/')
+    for _ in range(10):
+        histogram.observe(0.7, '/courses/')
+    assert histogram.quantile(0.5, '/courses/') == 0.1 * 50 / 90
+    assert histogram.quantile(0.95, '/courses/') == 0.75
+    assert histogram.quantile(0.95, '/subjects/') is None
+
+
+def test_histogram_quantile_above_last_bucket():
+    histogram = Histogram('latency', 'Latency.', [], buckets=(0.1, 0.5))
+    histogram.observe(3.0)
+    assert histogram.quantile(0.95) == 0.5
+
+
+def test_histogram_render():
+    histogram = Histogram('latency', 'Latency.', ['route'], buckets=(0.1, 0.5))
+    histogram.observe(0.2, '/courses/"x"')
+    assert histogram.render() == [
+        '# HELP latency Latency.',
+        '# TYPE latency histogram',
+        'latency_bucket{route="/courses/\\"x\\"",le="0.1"} 0',
+        'latency_bucket{route="/courses/\\"x\\"",le="0.5"} 1',
+        'latency_bucket{route="/courses/\\"x\\"",le="+Inf"} 1',
+        'latency_sum{route="/courses/\\"x\\""} 0.2',
+        'latency_count{route="/courses/\\"x\\""} 1',
+    ]
+
+
+def test_render_pool_metrics():
+    lines = render_pool_metrics({'primary': {'size': 10, 'checked_out': 2, 'checkouts': 7, 'wait_seconds_total': 0.5}})
+    assert '# TYPE db_pool_size gauge' in lines
+    assert 'db_pool_size{pool="primary"} 10' in lines
+    assert 'db_pool_checked_out{pool="primary"} 2' in lines
+    assert '# TYPE db_pool_checkouts_total counter' in lines
+    assert 'db_pool_checkouts_total{pool="primary"} 7' in lines
+    assert '# TYPE db_pool_wait_seconds_total counter' in lines
+    assert 'db_pool_wait_seconds_total{pool="primary"} 0.5' in lines
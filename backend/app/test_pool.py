@@ -0,0 +1,47 @@
+import pytest
+import pytest_asyncio
+from psycopg import Connection
+from pytest_postgresql import factories
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.pool import InstrumentedPool
+
+postgresql_proc = factories.postgresql_proc(dbname='test_db')
+postgresql = factories.postgresql('postgresql_proc')
+
+
+@pytest_asyncio.fixture(name='engine')
+async def engine_fixture(postgresql: Connection):
+    engine = create_async_engine(
+        f'postgresql+asyncpg://'
+        f'{postgresql.info.user}:'
+        f'{postgresql.info.password}@'
+        f'{postgresql.info.host}:{postgresql.info.port}/'
+        f'{postgresql.info.dbname}',
+        poolclass=InstrumentedPool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    yield engine
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_pool_stats(engine):
+    async with engine.connect() as conn:
+        await conn.execute(text('SELECT 1'))
+        status = engine.pool.status_dict()
+        assert status['checked_out'] == 1
+        assert status['checkouts'] == 1
+
+        with pytest.raises(exc.TimeoutError):
+            async with engine.connect():
+                pass
+
+    status = engine.pool.status_dict()
+    assert status['checked_out'] == 0
+    assert status['checkouts'] == 2
+    assert status['timeouts'] == 1
+    assert status['wait_seconds_max'] >= 0.1
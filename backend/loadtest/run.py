@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+# share of requests per scenario, roughly what the catalog page and the bot send
+SCENARIOS = {
+    'courses': 40,
+    'courses_next_page': 15,
+    'courses_filtered': 20,
+    'catalog': 10,
+    'search': 10,
+    'course': 5,
+}
+SEARCH_TERMS = ('python', 'машинное обучение', 'робототехника', 'алгоритмы', 'анализ данных', 'олимпиада')
+LATENCY_TARGET_MS = 500
+
+
+class Workload:
+    def __init__(
+        self, subjects: List[str], grades: List[int], course_ids: List[int], cursors: List[str], seed: int = 0
+    ):
+        self.subjects = subjects
+        self.grades = grades
+        self.course_ids = course_ids
+        self.cursors = cursors
+        self.rng = random.Random(seed)
+
+    @classmethod
+    async def discover(cls, client: httpx.AsyncClient, seed: int = 0) -> 'Workload':
+        subjects = [subject['type'] for subject in (await client.get('/subjects/')).raise_for_status().json()]
+        grades = [grade['grade'] for grade in (await client.get('/grades/')).raise_for_status().json()]
+        response = (await client.get('/courses/', params={'limit': 500})).raise_for_status()
+        cursors = [response.headers['X-Next-Cursor']] if 'X-Next-Cursor' in response.headers else []
+        return cls(subjects, grades, [course['id'] for course in response.json()], cursors, seed)
+
+    def next_request(self) -> Tuple[str, str, Dict]:
+        name = self.rng.choices(list(SCENARIOS), weights=list(SCENARIOS.values()))[0]
+        if name == 'courses_next_page' and self.cursors:
+            return name, '/courses/', {'cursor': self.rng.choice(self.cursors)}
+        if name == 'courses_filtered' and self.subjects:
+            params = {'subjects': self.rng.sample(self.subjects, min(len(self.subjects), self.rng.randint(1, 2)))}
+            if self.grades and self.rng.random() < 0.5:
+                params['grades'] = self.rng.choice(self.grades)
+            return name, '/courses/', params
+        if name == 'catalog':
+            return name, '/catalog/', {}
+        if name == 'search':
+            return name, '/courses/search/', {'q': self.rng.choice(SEARCH_TERMS)}
+        if name == 'course' and self.course_ids:
+            return name, f'/courses/{self.rng.choice(self.course_ids)}', {}
+        return 'courses', '/courses/', {}
+
+    def remember(self, response: httpx.Response) -> None:
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor and len(self.cursors) < 1000:
+            self.cursors.append(cursor)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'latency_ms': {
+            name: round(value * 1000, 2) if value is not None else None
+            for name, value in (
+                ('p50', percentile(latencies, 0.5)),
+                ('p95', percentile(latencies, 0.95)),
+                ('p99', percentile(latencies, 0.99)),
+                ('max', max(latencies, default=None)),
+            )
+        },
+    }
+
+
+async def run_level(client: httpx.AsyncClient, workload: Workload, concurrency: int, duration: float) -> dict:
+    latencies: Dict[str, List[float]] = {name: [] for name in SCENARIOS}
+    errors: Dict[str, int] = {name: 0 for name in SCENARIOS}
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            name, path, params = workload.next_request()
+            start = time.perf_counter()
+            try:
+                response = await client.get(path, params=params)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                response, failed = None, True
+            latencies[name].append(time.perf_counter() - start)
+            if failed:
+                errors[name] += 1
+            elif response is not None:
+                workload.remember(response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    result = summarize(sum(latencies.values(), []), sum(errors.values()), elapsed)
+    result['concurrency'] = concurrency
+    result['duration_seconds'] = round(elapsed, 2)
+    result['scenarios'] = {name: summarize(latencies[name], errors[name], elapsed) for name in SCENARIOS}
+    return result
+
+
+async def run(
+    base_url: str,
+    concurrency_levels: List[int],
+    duration: float,
+    warmup: float = 5,
+    seed: int = 0,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> dict:
+    limits = httpx.Limits(max_connections=max(concurrency_levels), max_keepalive_connections=max(concurrency_levels))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30, transport=transport) as client:
+        workload = await Workload.discover(client, seed)
+        if warmup:
+            await run_level(client, workload, min(concurrency_levels), warmup)
+        levels = [await run_level(client, workload, concurrency, duration) for concurrency in concurrency_levels]
+    return {
+        'base_url': base_url,
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'target_p95_ms': LATENCY_TARGET_MS,
+        'target_met': all(
+            level['latency_ms']['p95'] is not None and level['latency_ms']['p95'] <= LATENCY_TARGET_MS
+            for level in levels
+        ),
+        'levels': levels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive the catalog endpoints and report latency percentiles as JSON')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 100])
+    parser.add_argument('--duration', type=float, default=30, help='seconds per concurrency level')
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the report here instead of stdout')
+    parser.add_argument('--check', action='store_true', help='exit with 1 if p95 misses the target at any level')
+    args = parser.parse_args()
+    report = asyncio.run(run(args.base_url, args.concurrency, args.duration, args.warmup, args.seed))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+    if args.check and not report['target_met']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
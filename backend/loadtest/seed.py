@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Sequence
+
+from sqlalchemy import select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlmodel import SQLModel
+
+from app.models import (
+    CatalogVersion,
+    Course,
+    CourseGradeLink,
+    CourseRead,
+    CourseSubjectLink,
+    Difficulty,
+    Grade,
+    Organization,
+    Subject,
+    engine,
+)
+
+WORDS = (
+    'основы',
+    'программирование',
+    'python',
+    'алгоритмы',
+    'машинное',
+    'обучение',
+    'нейронные',
+    'сети',
+    'робототехника',
+    'анализ',
+    'данных',
+    'олимпиада',
+    'математика',
+    'физика',
+    'веб',
+    'разработка',
+    'информационная',
+    'безопасность',
+    'проект',
+    'интенсив',
+)
+ICON = '<path d="M4 4h16v16H4z"></path>'
+DIFFICULTY_WEIGHTS = {'beginner': 50, 'intermediate': 35, 'advanced': 15}
+SUBJECTS_PER_COURSE_WEIGHTS = (60, 30, 10)
+COURSE_LENGTHS = (7, 14, 30, 60, 90, 180, 270)
+COURSE_LENGTH_WEIGHTS = (10, 15, 25, 20, 15, 10, 5)
+COURSE_COLUMNS = (
+    'id',
+    'title',
+    'description',
+    'start_date',
+    'end_date',
+    'url',
+    'image_url',
+    'organization_id',
+    'difficulty_id',
+)
+# tables written with COPY; their courseread triggers are off during the load and the read model is built once after
+COPY_TABLES = (Course.__tablename__, CourseSubjectLink.__tablename__, CourseGradeLink.__tablename__)
+BULK_TABLES = COPY_TABLES + (CourseRead.__tablename__,)
+# secondary indexes and foreign keys of the bulk tables as (drop, create) statements; building them once after the
+# load is much cheaper than maintaining them row by row, see "Populating a Database" in the PostgreSQL docs
+DEFERRED_DDL_QUERY = text(
+    """
+    SELECT format('ALTER TABLE %s DROP CONSTRAINT %I', conrelid::regclass, conname),
+           format('ALTER TABLE %s ADD CONSTRAINT %I %s', conrelid::regclass, conname, pg_get_constraintdef(oid))
+    FROM pg_constraint
+    WHERE contype = 'f' AND conrelid::regclass::text = ANY(:tables)
+    UNION ALL
+    SELECT format('DROP INDEX %I', i.indexrelid::regclass), pg_get_indexdef(i.indexrelid)
+    FROM pg_index i
+    WHERE i.indrelid::regclass::text = ANY(:tables) AND NOT i.indisprimary AND NOT i.indisunique
+    """
+)
+
+
+def zipf_weights(count: int, exponent: float = 1.1) -> List[float]:
+    # a few organizations and subjects carry most of the catalog, like in the real one
+    return [1 / rank**exponent for rank in range(1, count + 1)]
+
+
+async def ensure_reference(conn: AsyncConnection, subjects: int, organizations: int) -> Dict[str, List[int]]:
+    statements = {
+        Subject: [
+            {
+                'type': f'subject{i}',
+                'label': f'Направление {i}',
+                'icon': ICON,
+                'color': '#3f51b5',
+                'additional_description': [],
+            }
+            for i in range(subjects)
+        ],
+        Difficulty: [{'type': name, 'label': name, 'icon': ICON, 'color': '#00bfa5'} for name in DIFFICULTY_WEIGHTS],
+        Grade: [{'grade': grade} for grade in range(1, 12)],
+        Organization: [{'name': f'Организация {i}'} for i in range(organizations)],
+    }
+    ids = {}
+    for model, rows in statements.items():
+        await conn.execute(insert(model).on_conflict_do_nothing(), rows)
+        order = Grade.grade if model is Grade else model.id
+        ids[model.__tablename__] = list((await conn.scalars(select(model.id).order_by(order))).all())
+    return ids
+
+
+class CatalogGenerator:
+    def __init__(self, ids: Dict[str, List[int]], seed: int = 0, start: date = date(2025, 1, 1), days: int = 730):
+        self.rng = random.Random(seed)
+        self.ids = ids
+        self.start = start
+        self.days = days
+        self.organization_weights = list(itertools.accumulate(zipf_weights(len(ids['organization']))))
+        self.subject_weights = zipf_weights(len(ids['subject']), exponent=0.8)
+        weights = list(DIFFICULTY_WEIGHTS.values())
+        self.difficulty_weights = list(
+            itertools.accumulate(weights[i % len(weights)] for i in range(len(ids['difficulty'])))
+        )
+        # senior school courses are more common than primary school ones
+        self.grade_weights = list(itertools.accumulate(range(1, len(ids['grade']) + 1)))
+
+    def courses(self, course_ids: Sequence[int]) -> List[tuple]:
+        rng, count = self.rng, len(course_ids)
+        organizations = rng.choices(self.ids['organization'], cum_weights=self.organization_weights, k=count)
+        difficulties = rng.choices(self.ids['difficulty'], cum_weights=self.difficulty_weights, k=count)
+        lengths = rng.choices(COURSE_LENGTHS, weights=COURSE_LENGTH_WEIGHTS, k=count)
+        rows = []
+        for course_id, organization_id, difficulty_id, length in zip(course_ids, organizations, difficulties, lengths):
+            start = self.start + timedelta(days=rng.randrange(self.days))
+            rows.append(
+                (
+                    course_id,
+                    ' '.join(rng.sample(WORDS, 3)).capitalize(),
+                    ' '.join(rng.choices(WORDS, k=20)),
+                    start,
+                    start + timedelta(days=length),
+                    f'https://example.com/courses/{course_id}',
+                    'https://placehold.co/100x100',
+                    organization_id,
+                    difficulty_id,
+                )
+            )
+        return rows
+
+    def subject_links(self, course_ids: Sequence[int]) -> List[tuple]:
+        rng, subjects = self.rng, self.ids['subject']
+        counts = rng.choices(
+            range(1, len(SUBJECTS_PER_COURSE_WEIGHTS) + 1), weights=SUBJECTS_PER_COURSE_WEIGHTS, k=len(course_ids)
+        )
+        rows = []
+        for course_id, count in zip(course_ids, counts):
+            chosen = set()
+            while len(chosen) < min(count, len(subjects)):
+                chosen.add(rng.choices(subjects, weights=self.subject_weights)[0])
+            rows.extend((course_id, subject_id) for subject_id in chosen)
+        return rows
+
+    def grade_links(self, course_ids: Sequence[int]) -> List[tuple]:
+        rng, grades = self.rng, self.ids['grade']
+        highs = rng.choices(range(len(grades)), cum_weights=self.grade_weights, k=len(course_ids))
+        rows = []
+        for course_id, high in zip(course_ids, highs):
+            # a contiguous range of grades, like "8-11"
+            low = max(high - rng.randint(0, 3), 0)
+            rows.extend((course_id, grade_id) for grade_id in grades[low : high + 1])
+        return rows
+
+
+async def copy_rows(conn: AsyncConnection, table: str, columns: Sequence[str], rows: List[tuple]) -> None:
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(table, records=rows, columns=list(columns))
+
+
+async def seed_catalog(
+    bind: AsyncEngine,
+    courses: int,
+    subjects: int = 8,
+    organizations: int = 200,
+    batch_size: int = 50_000,
+    seed: int = 0,
+) -> None:
+    """Append `courses` generated courses with their links in one transaction that locks the catalog tables."""
+    async with bind.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        ids = await ensure_reference(conn, subjects, organizations)
+    generator = CatalogGenerator(ids, seed)
+    async with bind.begin() as conn:
+        for table in COPY_TABLES:
+            await conn.execute(text(f'ALTER TABLE {table} DISABLE TRIGGER USER'))
+        deferred = (await conn.execute(DEFERRED_DDL_QUERY, {'tables': list(BULK_TABLES)})).all()
+        for drop, _ in deferred:
+            await conn.execute(text(drop))
+        for offset in range(0, courses, batch_size):
+            count = min(batch_size, courses - offset)
+            # the tables are locked for the whole load, so the block of ids can be taken in one go
+            last = await conn.scalar(
+                text("SELECT setval('course_id_seq', nextval('course_id_seq') + :n - 1)"), {'n': count}
+            )
+            course_ids = range(last - count + 1, last + 1)
+            await copy_rows(conn, Course.__tablename__, COURSE_COLUMNS, generator.courses(course_ids))
+            await copy_rows(
+                conn, CourseSubjectLink.__tablename__, ('course_id', 'subject_id'), generator.subject_links(course_ids)
+            )
+            await copy_rows(
+                conn, CourseGradeLink.__tablename__, ('course_id', 'grade_id'), generator.grade_links(course_ids)
+            )
+            await conn.execute(text('SELECT courseread_refresh(:ids)'), {'ids': list(course_ids)})
+        for _, create in reversed(deferred):
+            await conn.execute(text(create))
+        for table in COPY_TABLES:
+            await conn.execute(text(f'ALTER TABLE {table} ENABLE TRIGGER USER'))
+        # the disabled triggers did not bump it, response caches would keep serving the catalog without the new courses
+        await conn.execute(update(CatalogVersion).values(version=CatalogVersion.version + 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Append a synthetic catalog to the database in DAHA_DATABASE_URL')
+    parser.add_argument('--courses', type=int, default=100_000)
+    parser.add_argument('--subjects', type=int, default=8)
+    parser.add_argument('--organizations', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=50_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    asyncio.run(seed_catalog(engine, args.courses, args.subjects, args.organizations, args.batch_size, args.seed))
+    print(f'{args.courses} courses in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
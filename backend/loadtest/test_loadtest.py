@@ -0,0 +1,75 @@
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport
+from psycopg import Connection
+from pytest_postgresql import factories
+from sqlalchemy import func, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.cache import course_cache, course_tables_version
+from app.core.snapshot import reference_snapshot
+from app.models import CourseRead, get_session
+from loadtest.run import percentile, run
+from loadtest.seed import seed_catalog
+from main import api
+
+postgresql_proc = factories.postgresql_proc(dbname='test_db')
+postgresql = factories.postgresql('postgresql_proc')
+
+
+@pytest_asyncio.fixture(name='engine')
+async def engine_fixture(postgresql: Connection):
+    engine = create_async_engine(
+        f'postgresql+asyncpg://'
+        f'{postgresql.info.user}:'
+        f'{postgresql.info.password}@'
+        f'{postgresql.info.host}:{postgresql.info.port}/'
+        f'{postgresql.info.dbname}'
+    )
+    yield engine
+    await engine.dispose()
+
+
+def test_percentile():
+    values = [i / 100 for i in range(1, 101)]
+    assert percentile(values, 0.5) == 0.5
+    assert percentile(values, 0.95) == 0.95
+    assert percentile(values, 0.99) == 0.99
+    assert percentile([], 0.95) is None
+
+
+@pytest.mark.asyncio
+async def test_seed_and_run(engine):
+    await seed_catalog(engine, courses=300, batch_size=100)
+    async with AsyncSession(engine) as session:
+        assert (await session.exec(select(func.count()).select_from(CourseRead))).one() == 300
+        assert (await session.exec(select(func.count()).where(CourseRead.subjects == []))).one() == 0
+        assert (await session.exec(select(func.count()).where(CourseRead.grades == []))).one() == 0
+        # the read model triggers are back on after the load
+        disabled = await session.exec(
+            text("SELECT count(*) FROM pg_trigger WHERE tgname LIKE '%courseread%' AND tgenabled = 'D'")
+        )
+        assert disabled.one() == (0,)
+        foreign_keys = await session.exec(text("SELECT count(*) FROM pg_constraint WHERE contype = 'f'"))
+        assert foreign_keys.one() == (7,)
+
+    async def get_session_override():
+        async with AsyncSession(engine) as session:
+            yield session
+
+    api.dependency_overrides[get_session] = get_session_override
+    reference_snapshot.invalidate()
+    async with AsyncSession(engine) as session:
+        course_cache.invalidate(await course_tables_version(session))
+    try:
+        report = await run('http://test', [2], duration=0.5, warmup=0, transport=ASGITransport(api))
+    finally:
+        api.dependency_overrides.clear()
+    [level] = report['levels']
+    assert level['concurrency'] == 2
+    assert level['requests'] > 0
+    assert level['errors'] == 0
+    assert set(level['latency_ms']) == {'p50', 'p95', 'p99', 'max'}
+    assert level['scenarios']['courses']['requests'] > 0
@@ -1,6 +1,8 @@
 import uvicorn
 
 from app.api import create_app
+from app.compression import CompressionMiddleware
+from app.metrics import MetricsMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 
 api = create_app()
@@ -10,7 +12,10 @@ api.add_middleware(
     allow_credentials=True,
     allow_methods=['*'],
     allow_headers=['*'],
+    expose_headers=['X-Next-Cursor'],
 )
+api.add_middleware(CompressionMiddleware)
+api.add_middleware(MetricsMiddleware)
 
 if __name__ == '__main__':
     uvicorn.run('main:api', host='127.0.0.1', port=8000, reload=True)
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+import httpx
+
+from search import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight call and get its result or its exception."""
+
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        future = self.calls.get(key)
+        if future is None:
+            future = self.calls[key] = asyncio.ensure_future(call())
+            future.add_done_callback(lambda _: self.calls.pop(key, None))
+        # a caller that gives up must not cancel the call for everyone else waiting on it
+        return await asyncio.shield(future)
+
+
+class CourseCatalog:
+    """The whole course list kept in memory, so paging through it never calls the backend."""
+
+    def __init__(self):
+        self.courses: List[dict] = []
+        self.etag: Optional[str] = None
+        self.loaded = False
+        self.flights = SingleFlight()
+        self.index = SearchIndex([])
+
+    async def refresh(self, client: httpx.AsyncClient) -> bool:
+        # users opening the list together before the first load, and the background refresh, share one download
+        return await self.flights.do("export", lambda: self.download(client))
+
+    async def download(self, client: httpx.AsyncClient) -> bool:
+        # the export endpoint streams every course and answers 304 while nothing has changed
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        async with client.stream("GET", "/courses/export/", headers=headers) as response:
+            if response.status_code == 304:
+                return False
+            response.raise_for_status()
+            courses = [json.loads(line) async for line in response.aiter_lines() if line.strip()]
+        self.courses = courses
+        # a fresh index also drops the answers cached for the old catalog
+        self.index = SearchIndex(courses)
+        self.etag = response.headers.get("ETag")
+        self.loaded = True
+        return True
+
+    async def refresh_periodically(self, client: httpx.AsyncClient, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(client)
+            except Exception:
+                logger.exception("Failed to refresh the course catalog")
+
+    def page(self, offset: int, size: int) -> List[dict]:
+        return self.courses[offset:offset + size]
+
+    def page_offset(self, offset: int, size: int) -> int:
+        # stale buttons may point past the end after the catalog shrank
+        last = max(len(self.courses) - 1, 0) // size * size
+        return min(max(offset, 0) // size * size, last)
@@ -1,60 +1,210 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, CallbackContext
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+import asyncio
+import logging
+import os
+import secrets
+from typing import Optional
 
-TOKEN = "7969990682:AAFBV-0Xtx61WEaBSlPP1CU4arggZQQBAPQ"
+import httpx
+from telegram import (
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+)
+from telegram.ext import (
+    Application,
+    ApplicationHandlerStop,
+    CommandHandler,
+    CallbackQueryHandler,
+    ContextTypes,
+    InlineQueryHandler,
+)
+from telegram.request import BaseRequest
 
+from catalog import CourseCatalog
+from search import SEARCH_CACHE_TTL
+from throttle import UserThrottle
+from webhook import run_webhook
 
-def start(update: Update, context: CallbackContext) -> None:
+TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
+API_URL = os.environ.get("DAHA_API_URL", "https://api.daha.pro")
+API_KEY = os.environ.get("DAHA_API_KEY")
+
+# one pooled client for the whole bot: connections are reused and a slow backend cannot hang a handler forever
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+COURSES_ON_SCREEN = 10
+CATALOG_REFRESH_INTERVAL = float(os.environ.get("CATALOG_REFRESH_INTERVAL", 60))
+# the most results Telegram accepts in one answer to an inline query
+INLINE_RESULTS = 50
+# each user may press buttons CALLBACK_BURST times at once, then CALLBACK_RATE times per second
+CALLBACK_RATE = float(os.environ.get("CALLBACK_RATE", 1))
+CALLBACK_BURST = int(os.environ.get("CALLBACK_BURST", 5))
+
+# webhook mode is used when a public url is configured, long polling otherwise
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+# the webhook is registered again on every start, so a random secret is fine unless several instances share it
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8081))
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 16))
+
+logger = logging.getLogger(__name__)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    headers = {"Authorization": f"Bearer {API_KEY}"} if API_KEY else {}
+    return httpx.AsyncClient(base_url=API_URL, headers=headers, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     keyboard = [
         [InlineKeyboardButton("View courses", callback_data='show_courses')]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text('Hello! I am a bot for selecting courses from daha.pro.', reply_markup=reply_markup)
+    await update.message.reply_text('Hello! I am a bot for selecting courses from daha.pro.', reply_markup=reply_markup)
+
+
+async def throttle_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    if not context.bot_data["throttle"].allow(query.from_user.id):
+        # the query is still answered, otherwise the button keeps spinning in the client
+        await query.answer("Too many requests, please wait a moment.")
+        raise ApplicationHandlerStop
+
 
+def courses_keyboard(catalog: CourseCatalog, offset: int) -> InlineKeyboardMarkup:
+    keyboard = []
+    for course in catalog.page(offset, COURSES_ON_SCREEN):
+        title = course.get("title", "Untitled course")
+        url = course.get("url", "https://daha.pro/")
+        keyboard.append([InlineKeyboardButton(title, url=url)])
 
-def show_courses(update: Update, context: CallbackContext) -> None:
+    # the offset travels in the callback data, so any page can be rebuilt from memory
+    navigation = []
+    if offset > 0:
+        navigation.append(InlineKeyboardButton("◀️ Previous", callback_data=f"courses:{offset - COURSES_ON_SCREEN}"))
+    if offset + COURSES_ON_SCREEN < len(catalog.courses):
+        navigation.append(InlineKeyboardButton("Next ▶️", callback_data=f"courses:{offset + COURSES_ON_SCREEN}"))
+    if navigation:
+        keyboard.append(navigation)
+    return InlineKeyboardMarkup(keyboard)
+
+
+async def show_courses(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
-    query.answer()
+    await query.answer()
+
+    catalog: CourseCatalog = context.bot_data["catalog"]
+
+    try:
+        if not catalog.loaded:
+            # only until the first successful load, after that the background refresh keeps it current
+            await catalog.refresh(context.bot_data["http"])
+    except httpx.HTTPStatusError:
+        await query.edit_message_text("API access error. Please check your key.")
+        return
+    except Exception:
+        logger.exception("Failed to load courses")
+        await query.edit_message_text("⚠️ API is not responding. Please try again later.")
+        return
+
+    if not catalog.courses:
+        await query.edit_message_text("No courses found.")
+        return
+
+    _, _, offset = query.data.partition(":")
+    offset = catalog.page_offset(int(offset or 0), COURSES_ON_SCREEN)
+    last = min(offset + COURSES_ON_SCREEN, len(catalog.courses))
+    await query.edit_message_text(
+        text=f"📚 Available courses ({offset + 1}–{last} of {len(catalog.courses)}):",
+        reply_markup=courses_keyboard(catalog, offset),
+    )
+
+
+def course_article(course: dict) -> InlineQueryResultArticle:
+    title = course.get("title", "Untitled course")
+    url = course.get("url", "https://daha.pro/")
+    details = []
+    if course.get("subjects"):
+        details.append(", ".join(course["subjects"]))
+    grades = course.get("grades")
+    if grades:
+        details.append(f"grades {min(grades)}–{max(grades)}" if len(grades) > 1 else f"grade {grades[0]}")
+    return InlineQueryResultArticle(
+        id=str(course.get("id", url)),
+        title=title,
+        description=" · ".join(details),
+        url=url,
+        input_message_content=InputTextMessageContent(f"{title}\n{url}"),
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Open course", url=url)]]),
+    )
+
+
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # answered from the in-memory index only, a keystroke never reaches the backend
+    query = update.inline_query
+    catalog: CourseCatalog = context.bot_data["catalog"]
+    courses = catalog.index.search(query.query)
+    offset = int(query.offset or 0)
+    next_offset = offset + INLINE_RESULTS
+    await query.answer(
+        [course_article(course) for course in courses[offset:next_offset]],
+        # Telegram caches the answer too, but an empty catalog should not be remembered
+        cache_time=SEARCH_CACHE_TTL if catalog.loaded else 0,
+        next_offset=str(next_offset) if next_offset < len(courses) else "",
+    )
 
-    API_URL = "https://api.daha.pro/courses"  # Replace with actual endpoint
-    HEADERS = {"Authorization": "Bearer YOUR_API_KEY"}  # If needed
 
+async def post_init(application: Application) -> None:
+    client = application.bot_data["http"] = create_http_client()
+    catalog = application.bot_data["catalog"] = CourseCatalog()
     try:
-        response = requests.get(API_URL, headers=HEADERS)
-        if response.status_code != 200:
-            query.edit_message_text("API access error. Please check your key.")
-            return
+        await catalog.refresh(client)
+    except Exception:
+        logger.exception("Failed to load the course catalog, it will be loaded on first use")
+    application.bot_data["refresh"] = asyncio.create_task(
+        catalog.refresh_periodically(client, CATALOG_REFRESH_INTERVAL)
+    )
 
-        courses = response.json()
-        if not courses:
-            query.edit_message_text("No courses found.")
-            return
 
-        keyboard = []
-        for course in courses[:10]:  # Limit to 10 courses
-            title = course.get("title", "Untitled course")
-            url = course.get("url", "https://daha.pro/")
-            keyboard.append([InlineKeyboardButton(title, url=url)])
+async def post_shutdown(application: Application) -> None:
+    application.bot_data["refresh"].cancel()
+    await application.bot_data["http"].aclose()
 
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.edit_message_text(text="📚 Available courses:", reply_markup=reply_markup)
 
-    except Exception as e:
-        print(f"Error: {e}")
-        query.edit_message_text("⚠️ API is not responding. Please try again later.")
+def build_application(token: str, request: Optional[BaseRequest] = None) -> Application:
+    # concurrent_updates lets a slow callback run next to the others instead of queueing every user behind it
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(True)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if request:
+        builder = builder.request(request)
+    application = builder.build()
+    application.bot_data["throttle"] = UserThrottle(CALLBACK_RATE, CALLBACK_BURST)
+    # group -1 runs before the handlers below and stops the update when the user is over the limit
+    application.add_handler(CallbackQueryHandler(throttle_callbacks), group=-1)
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CallbackQueryHandler(show_courses, pattern=r'^(show_courses|courses:\d+)$'))
+    application.add_handler(InlineQueryHandler(inline_search))
+    return application
 
 
 def main() -> None:
-    updater = Updater(TOKEN)
-    dispatcher = updater.dispatcher
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(CallbackQueryHandler(show_courses, pattern='^show_courses$'))
-    updater.start_polling()
-    updater.idle()
+    logging.basicConfig(level=logging.INFO)
+    if not TOKEN:
+        raise SystemExit("TELEGRAM_BOT_TOKEN is not set")
+    application = build_application(TOKEN)
+    if WEBHOOK_URL:
+        asyncio.run(run_webhook(application, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_PORT, WEBHOOK_WORKERS, WEBHOOK_HOST))
+    else:
+        application.run_polling()
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,66 @@
+import bisect
+import re
+import time
+from typing import Callable, Dict, List, Set, Tuple
+
+SEARCH_CACHE_TTL = 30
+MAX_CACHED_QUERIES = 1000
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def words(text: str) -> List[str]:
+    return WORD_PATTERN.findall(text.lower())
+
+
+class SearchIndex:
+    """Prefix search over course titles, subjects and grades; answers are kept for `ttl` seconds per query."""
+
+    def __init__(self, courses: List[dict], ttl: float = SEARCH_CACHE_TTL, clock: Callable[[], float] = time.monotonic):
+        self.courses = courses
+        self.ttl = ttl
+        self.clock = clock
+        # word -> positions of the courses containing it, positions keep the catalog order
+        self.postings: Dict[str, Set[int]] = {}
+        for position, course in enumerate(courses):
+            course_words = words(course.get("title", ""))
+            course_words += [word for subject in course.get("subjects", []) for word in words(subject)]
+            course_words += [str(grade) for grade in course.get("grades", [])]
+            for word in course_words:
+                self.postings.setdefault(word, set()).add(position)
+        self.vocabulary = sorted(self.postings)
+        # normalized query -> (expires at, matching courses)
+        self.cache: Dict[str, Tuple[float, List[dict]]] = {}
+
+    def matching(self, prefix: str) -> Set[int]:
+        if prefix.isdigit():
+            # a number is a grade, "1" should not find every course for grades 10 and 11
+            return self.postings.get(prefix, set())
+        found = set()
+        i = bisect.bisect_left(self.vocabulary, prefix)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(prefix):
+            found |= self.postings[self.vocabulary[i]]
+            i += 1
+        return found
+
+    def search(self, query: str) -> List[dict]:
+        prefixes = words(query)
+        key = " ".join(prefixes)
+        now = self.clock()
+        cached = self.cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        if prefixes:
+            # every word of the query has to match, rarest first so the intersection shrinks fast
+            candidates = sorted((self.matching(prefix) for prefix in prefixes), key=len)
+            positions = set.intersection(*candidates)
+            found = [self.courses[position] for position in sorted(positions)]
+        else:
+            found = self.courses
+
+        if len(self.cache) >= MAX_CACHED_QUERIES:
+            self.cache = {k: v for k, v in self.cache.items() if v[0] > now}
+            if len(self.cache) >= MAX_CACHED_QUERIES:
+                self.cache.clear()
+        self.cache[key] = (now + self.ttl, found)
+        return found
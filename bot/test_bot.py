@@ -1,7 +1,43 @@
+import asyncio
+import json
+
+import httpx
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+import pytest_asyncio
+from unittest.mock import AsyncMock, Mock, MagicMock
 from telegram import Update, Message, Chat, User
-from main import start, show_courses  # Импортируем из main.py
+from telegram.ext import ApplicationHandlerStop
+from catalog import CourseCatalog
+import main
+from main import (  # Импортируем из main.py
+    start,
+    show_courses,
+    throttle_callbacks,
+    inline_search,
+    build_application,
+    create_http_client,
+)
+from throttle import UserThrottle
+
+COURSES = [
+    {"title": "Python Basics", "url": "https://daha.pro/python"},
+    {"title": "Advanced Django", "url": "https://daha.pro/django"}
+]
+
+
+def api_client(handler) -> httpx.AsyncClient:
+    # настоящий httpx-клиент, запросы к API обрабатывает handler
+    return httpx.AsyncClient(base_url="https://api.daha.pro", transport=httpx.MockTransport(handler))
+
+
+def ndjson(courses) -> bytes:
+    return "".join(json.dumps(course) + "\n" for course in courses).encode()
+
+
+def respond_with(status_code, courses=()):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(status_code, content=ndjson(courses), headers={"ETag": 'W/"v1"'})
+    return handler
 
 
 # Фикстуры для тестов
@@ -17,6 +53,7 @@ def update_start():
     chat.id = 456
     message.chat = chat
     message.from_user = user
+    message.reply_text = AsyncMock()
     update.message = message
 
     return update
@@ -25,7 +62,7 @@ def update_start():
 @pytest.fixture
 def update_callback():
     update = Mock(spec=Update)
-    query = Mock()
+    query = AsyncMock()
     message = Mock(spec=Message)
     user = Mock(spec=User)
 
@@ -45,13 +82,31 @@ def context():
     context.bot = Mock()
     context.user_data = {}
     context.chat_data = {}
+    context.bot_data = {}
     context.job_queue = Mock()
     return context
 
 
+@pytest_asyncio.fixture
+async def use_api(context):
+    clients = []
+
+    def install(handler):
+        client = api_client(handler)
+        clients.append(client)
+        context.bot_data["http"] = client
+        context.bot_data["catalog"] = CourseCatalog()
+        return client
+
+    yield install
+    for client in clients:
+        await client.aclose()
+
+
 # Тесты для команды /start
-def test_start_command(update_start, context):
-    start(update_start, context)
+@pytest.mark.asyncio
+async def test_start_command(update_start, context):
+    await start(update_start, context)
 
     # Проверяем отправку сообщения
     update_start.message.reply_text.assert_called_once()
@@ -60,29 +115,29 @@ def test_start_command(update_start, context):
     actual_text = update_start.message.reply_text.call_args[0][0]
     assert "Hello! I am a bot for selecting courses from daha.pro." in actual_text
 
+
 # Тесты для callback show_courses
-@patch('main.requests.get')
-def test_show_courses_success(mock_get, update_callback, context):
-    # Мокируем ответ API с правильной структурой данных
-    mock_response = Mock()
-    mock_response.status_code = 200
-    mock_response.json.return_value = [
-        {"title": "Python Basics", "url": "https://daha.pro/python"},
-        {"title": "Advanced Django", "url": "https://daha.pro/django"}
-    ]
-    mock_get.return_value = mock_response
+@pytest.mark.asyncio
+async def test_show_courses_success(update_callback, context, use_api):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=ndjson(COURSES))
 
-    show_courses(update_callback, context)
+    use_api(handler)
+    await show_courses(update_callback, context)
 
     # Проверяем вызовы
     update_callback.callback_query.answer.assert_called_once()
     update_callback.callback_query.edit_message_text.assert_called_once()
+    assert requests[0].url.path == "/courses/export/"
 
     # Получаем аргументы вызова
     call_args = update_callback.callback_query.edit_message_text.call_args
 
     # Проверяем текст сообщения
-    assert call_args[1]['text'] == "📚 Available courses:"
+    assert call_args[1]['text'] == "📚 Available courses (1–2 of 2):"
 
     # Проверяем наличие кнопок с курсами
     reply_markup = call_args[1]['reply_markup']
@@ -92,39 +147,267 @@ def test_show_courses_success(mock_get, update_callback, context):
     assert reply_markup.inline_keyboard[1][0].text == "Advanced Django"
     assert reply_markup.inline_keyboard[1][0].url == "https://daha.pro/django"
 
-@patch('main.requests.get')
-def test_show_courses_api_error(mock_get, update_callback, context):
+
+@pytest.mark.asyncio
+async def test_show_courses_api_error(update_callback, context, use_api):
     # Мокируем ошибку API
-    mock_response = Mock()
-    mock_response.status_code = 403
-    mock_get.return_value = mock_response
+    use_api(respond_with(403))
 
-    show_courses(update_callback, context)
+    await show_courses(update_callback, context)
 
     update_callback.callback_query.edit_message_text.assert_called_once_with(
         "API access error. Please check your key."
     )
 
 
-@patch('main.requests.get')
-def test_show_courses_empty_response(mock_get, update_callback, context):
+@pytest.mark.asyncio
+async def test_show_courses_empty_response(update_callback, context, use_api):
     # Мокируем пустой ответ
-    mock_response = Mock()
-    mock_response.status_code = 200
-    mock_response.json.return_value = []
-    mock_get.return_value = mock_response
+    use_api(respond_with(200))
 
-    show_courses(update_callback, context)
+    await show_courses(update_callback, context)
 
     update_callback.callback_query.edit_message_text.assert_called_once_with(
         "No courses found."
     )
 
 
-@patch('main.requests.get')
-def test_show_courses_exception(mock_get, update_callback, context):
-    mock_get.side_effect = Exception("API error")
-    show_courses(update_callback, context)
+@pytest.mark.asyncio
+async def test_show_courses_exception(update_callback, context, use_api):
+    def handler(request):
+        raise httpx.ConnectError("API error")
+
+    use_api(handler)
+    await show_courses(update_callback, context)
     update_callback.callback_query.edit_message_text.assert_called_once_with(
         "⚠️ API is not responding. Please try again later."
-    )
\ No newline at end of file
+    )
+
+
+@pytest.mark.asyncio
+async def test_slow_api_does_not_block_other_users(context, use_api):
+    # пока один запрос ждёт медленный API, остальные обрабатываются параллельно
+    release = asyncio.Event()
+
+    async def handler(request):
+        if request.url.params.get("slow"):
+            await release.wait()
+        return httpx.Response(200, content=ndjson(COURSES))
+
+    client = use_api(handler)
+    slow = asyncio.create_task(client.get("/courses/export/", params={"slow": 1}))
+    updates = [Mock(spec=Update, callback_query=AsyncMock(data="show_courses")) for _ in range(5)]
+    await asyncio.wait_for(asyncio.gather(*(show_courses(update, context) for update in updates)), timeout=1)
+    for update in updates:
+        assert update.callback_query.edit_message_text.call_args[1]['text'].startswith("📚 Available courses")
+    release.set()
+    await slow
+
+
+@pytest.mark.asyncio
+async def test_course_pages_are_served_from_memory(update_callback, context, use_api):
+    requests = []
+    courses = [{"title": f"Course {i}", "url": f"https://daha.pro/{i}"} for i in range(25)]
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=ndjson(courses))
+
+    use_api(handler)
+
+    async def tap(data):
+        update_callback.callback_query.data = data
+        await show_courses(update_callback, context)
+        call_args = update_callback.callback_query.edit_message_text.call_args[1]
+        keyboard = call_args['reply_markup'].inline_keyboard
+        return call_args['text'], [row[0].text for row in keyboard[:-1]], [b.callback_data for b in keyboard[-1]]
+
+    text, titles, navigation = await tap("show_courses")
+    assert text == "📚 Available courses (1–10 of 25):"
+    assert titles[0] == "Course 0"
+    assert navigation == ["courses:10"]
+
+    text, titles, navigation = await tap("courses:10")
+    assert text == "📚 Available courses (11–20 of 25):"
+    assert titles[0] == "Course 10"
+    assert navigation == ["courses:0", "courses:20"]
+
+    text, titles, navigation = await tap("courses:20")
+    assert text == "📚 Available courses (21–25 of 25):"
+    assert navigation == ["courses:10"]
+
+    # устаревшая кнопка после того, как каталог уменьшился
+    text, _, _ = await tap("courses:90")
+    assert text == "📚 Available courses (21–25 of 25):"
+
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_catalog_refresh_uses_etag():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.headers.get("If-None-Match") == 'W/"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=ndjson(COURSES), headers={"ETag": 'W/"v1"'})
+
+    catalog = CourseCatalog()
+    async with api_client(handler) as client:
+        assert await catalog.refresh(client) is True
+        assert await catalog.refresh(client) is False
+    assert [course["title"] for course in catalog.courses] == ["Python Basics", "Advanced Django"]
+    assert "If-None-Match" not in requests[0].headers
+    assert requests[1].headers["If-None-Match"] == 'W/"v1"'
+
+
+@pytest.mark.asyncio
+async def test_concurrent_loads_share_one_request(context, use_api):
+    # пользователи открывают список одновременно, пока каталог ещё не загружен
+    requests = []
+    release = asyncio.Event()
+
+    async def handler(request):
+        requests.append(request)
+        await release.wait()
+        return httpx.Response(200, content=ndjson(COURSES))
+
+    use_api(handler)
+    updates = [Mock(spec=Update, callback_query=AsyncMock(data="show_courses")) for _ in range(10)]
+    tasks = [asyncio.create_task(show_courses(update, context)) for update in updates]
+    await asyncio.sleep(0.01)
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert len(requests) == 1
+    for update in updates:
+        assert update.callback_query.edit_message_text.call_args[1]['text'] == "📚 Available courses (1–2 of 2):"
+
+
+@pytest.mark.asyncio
+async def test_failed_load_is_shared_and_retried(context, use_api):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(503 if len(requests) == 1 else 200, content=ndjson(COURSES))
+
+    use_api(handler)
+    updates = [Mock(spec=Update, callback_query=AsyncMock(data="show_courses")) for _ in range(3)]
+    await asyncio.gather(*(show_courses(update, context) for update in updates))
+    for update in updates:
+        update.callback_query.edit_message_text.assert_called_once_with("API access error. Please check your key.")
+
+    # ошибка не запоминается, следующее нажатие загружает каталог заново
+    await show_courses(updates[0], context)
+    assert len(requests) == 2
+    assert updates[0].callback_query.edit_message_text.call_args[1]['text'] == "📚 Available courses (1–2 of 2):"
+
+
+def test_user_throttle():
+    now = [0.0]
+    throttle = UserThrottle(rate=1, burst=3, clock=lambda: now[0])
+
+    assert [throttle.allow(1) for _ in range(4)] == [True, True, True, False]
+    assert throttle.allow(2)  # у каждого пользователя своё ведро
+
+    now[0] = 1.5
+    assert [throttle.allow(1) for _ in range(2)] == [True, False]
+    now[0] = 100
+    assert [throttle.allow(1) for _ in range(4)] == [True, True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_throttle_callbacks(update_callback, context):
+    context.bot_data["throttle"] = UserThrottle(rate=0, burst=2)
+
+    await throttle_callbacks(update_callback, context)
+    await throttle_callbacks(update_callback, context)
+    update_callback.callback_query.answer.assert_not_called()
+
+    with pytest.raises(ApplicationHandlerStop):
+        await throttle_callbacks(update_callback, context)
+    update_callback.callback_query.answer.assert_called_once_with("Too many requests, please wait a moment.")
+
+
+@pytest.mark.asyncio
+async def test_inline_search(context, use_api):
+    requests = []
+    courses = [
+        {"id": i, "title": f"Python {i}", "url": f"https://daha.pro/{i}", "subjects": ["programming"], "grades": [8, 9]}
+        for i in range(60)
+    ]
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=ndjson(courses))
+
+    use_api(handler)
+    await context.bot_data["catalog"].refresh(context.bot_data["http"])
+
+    async def search(text, offset=""):
+        update = Mock(spec=Update, inline_query=AsyncMock(query=text, offset=offset))
+        await inline_search(update, context)
+        return update.inline_query.answer.call_args
+
+    call_args = await search("pyt")
+    results = call_args[0][0]
+    assert len(results) == 50
+    assert results[0].title == "Python 0"
+    assert results[0].description == "programming · grades 8–9"
+    assert results[0].input_message_content.message_text == "Python 0\nhttps://daha.pro/0"
+    assert call_args[1]["next_offset"] == "50"
+    assert call_args[1]["cache_time"] > 0
+
+    call_args = await search("pyt", offset="50")
+    assert [result.id for result in call_args[0][0]] == [str(i) for i in range(50, 60)]
+    assert call_args[1]["next_offset"] == ""
+
+    call_args = await search("python 59")
+    assert [result.title for result in call_args[0][0]] == ["Python 59"]
+    call_args = await search("python 10")
+    assert [result.title for result in call_args[0][0]] == ["Python 10"]
+    call_args = await search("python 8 programming")
+    assert len(call_args[0][0]) == 50
+    call_args = await search("math")
+    assert call_args[0][0] == []
+
+    # ни одно нажатие клавиши не обращается к API
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_inline_search_before_catalog_is_loaded(context):
+    context.bot_data["catalog"] = CourseCatalog()
+    update = Mock(spec=Update, inline_query=AsyncMock(query="python", offset=""))
+    await inline_search(update, context)
+    update.inline_query.answer.assert_called_once_with([], cache_time=0, next_offset="")
+
+
+@pytest.mark.asyncio
+async def test_http_client_settings():
+    async with create_http_client() as client:
+        assert client.timeout.connect == 3.0
+        assert client.timeout.read == 10.0
+        assert str(client.base_url).startswith("https://api.daha.pro")
+
+
+def test_main_requires_token(monkeypatch):
+    # без токена бот не запускается, а не ходит в Telegram с чужим
+    monkeypatch.setattr(main, "TOKEN", None)
+    with pytest.raises(SystemExit, match="TELEGRAM_BOT_TOKEN"):
+        main.main()
+
+
+def test_build_application():
+    application = build_application("123456:TEST")
+    handlers = application.handlers[0]
+    assert [type(handler).__name__ for handler in handlers] == [
+        "CommandHandler",
+        "CallbackQueryHandler",
+        "InlineQueryHandler",
+    ]
+    assert [handler.callback for handler in application.handlers[-1]] == [throttle_callbacks]
+    assert isinstance(application.bot_data["throttle"], UserThrottle)
+    assert application.update_processor.max_concurrent_updates > 1
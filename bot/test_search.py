@@ -0,0 +1,42 @@
+from search import SearchIndex
+
+COURSES = [
+    {"id": 1, "title": "Основы машинного обучения", "subjects": ["ai", "programming"], "grades": [9, 10, 11]},
+    {"id": 2, "title": "Python Fundamentals", "subjects": ["programming"], "grades": [7, 8]},
+    {"id": 3, "title": "Олимпиадная математика", "subjects": ["math"], "grades": [1, 2]},
+]
+
+
+def ids(courses):
+    return [course["id"] for course in courses]
+
+
+def test_prefix_search():
+    index = SearchIndex(COURSES)
+    assert ids(index.search("pyth")) == [2]
+    assert ids(index.search("МАШИН")) == [1]
+    assert ids(index.search("prog")) == [1, 2]
+    assert ids(index.search("prog 8")) == [2]
+    assert ids(index.search("обучение python")) == []
+    assert ids(index.search("nothing")) == []
+    # пустой запрос показывает весь каталог
+    assert ids(index.search("  ")) == [1, 2, 3]
+
+
+def test_grades_match_exactly():
+    index = SearchIndex(COURSES)
+    assert ids(index.search("1")) == [3]
+    assert ids(index.search("10")) == [1]
+
+
+def test_results_are_cached_per_query():
+    now = [0.0]
+    index = SearchIndex(COURSES, ttl=30, clock=lambda: now[0])
+    first = index.search("Prog")
+    # запрос нормализуется, поэтому другой регистр и пробелы попадают в тот же кэш
+    assert index.search(" prog ") is first
+    assert list(index.cache) == ["prog"]
+
+    now[0] = 31
+    assert index.search("prog") is not first
+    assert index.cache["prog"][0] == 61
@@ -0,0 +1,166 @@
+import asyncio
+import json
+from urllib.parse import parse_qsl
+
+import httpx
+import pytest
+import pytest_asyncio
+from telegram.request import HTTPXRequest
+
+from catalog import CourseCatalog
+from main import build_application
+from webhook import SECRET_TOKEN_HEADER, WebhookReceiver
+
+SECRET = "test-secret"
+CHAT = {"id": 456, "type": "private"}
+USER = {"id": 123, "is_bot": False, "first_name": "TestUser"}
+
+
+class FakeTelegram:
+    """Bot API stand-in: records every method call and answers like Telegram would."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        method = request.url.path.rsplit("/", 1)[-1]
+        params = dict(parse_qsl(request.content.decode()))
+        self.calls.append((method, params))
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Daha", "username": "dahapro_bot"}
+        elif method in ("sendMessage", "editMessageText"):
+            result = {"message_id": 1, "date": 0, "chat": CHAT, "text": params.get("text", "")}
+        else:
+            result = True
+        return httpx.Response(200, json={"ok": True, "result": result})
+
+    def methods(self):
+        return [method for method, _ in self.calls]
+
+
+def message_update(update_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": CHAT,
+            "from": USER,
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+        },
+    }
+
+
+def callback_update(update_id: int, data: str) -> dict:
+    message = {"message_id": 1, "date": 0, "chat": CHAT, "text": "Hello!"}
+    return {
+        "update_id": update_id,
+        "callback_query": {"id": str(update_id), "from": USER, "chat_instance": "1", "message": message, "data": data},
+    }
+
+
+@pytest_asyncio.fixture
+async def telegram():
+    return FakeTelegram()
+
+
+@pytest_asyncio.fixture
+async def bot(telegram):
+    request = HTTPXRequest(httpx_kwargs={"transport": httpx.MockTransport(telegram)})
+    application = build_application("123456:TEST", request=request)
+    await application.initialize()
+    yield application
+    await application.shutdown()
+
+
+@pytest_asyncio.fixture
+async def webhook(bot):
+    receivers = []
+
+    async def start(api_handler, workers=4, max_pending=100):
+        bot.bot_data["http"] = httpx.AsyncClient(base_url="https://api.daha.pro", transport=httpx.MockTransport(api_handler))
+        bot.bot_data["catalog"] = CourseCatalog()
+        receiver = WebhookReceiver(bot, SECRET, workers, max_pending)
+        await receiver.start()
+        receivers.append(receiver)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=receiver.asgi_app("/telegram")), base_url="http://bot")
+        return receiver, client
+
+    yield start
+    for receiver in receivers:
+        await receiver.stop()
+    await bot.bot_data["http"].aclose()
+
+
+def post(client: httpx.AsyncClient, update: dict, secret: str = SECRET):
+    return client.post("/telegram", json=update, headers={SECRET_TOKEN_HEADER: secret})
+
+
+def gated_api():
+    # the backend answers only once the gate is set
+    gate = asyncio.Event()
+
+    async def handler(request):
+        await gate.wait()
+        courses = [{"title": "Python Basics", "url": "https://daha.pro/python"}]
+        return httpx.Response(200, content="".join(json.dumps(c) + "\n" for c in courses))
+
+    return gate, handler
+
+
+@pytest.mark.asyncio
+async def test_webhook_start_command(webhook, telegram):
+    receiver, client = await webhook(lambda request: httpx.Response(500))
+    response = await post(client, message_update(1, "/start"))
+    assert response.status_code == 200
+
+    await receiver.queue.join()
+    method, params = telegram.calls[-1]
+    assert method == "sendMessage"
+    assert params["text"] == "Hello! I am a bot for selecting courses from daha.pro."
+    assert json.loads(params["reply_markup"])["inline_keyboard"][0][0]["callback_data"] == "show_courses"
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_wrong_secret(webhook, telegram):
+    receiver, client = await webhook(lambda request: httpx.Response(500))
+    assert (await post(client, message_update(1, "/start"), secret="guess")).status_code == 403
+    assert (await client.post("/telegram", json=message_update(2, "/start"))).status_code == 403
+    assert (await post(client, {"message": "no update id"})).status_code == 400
+
+    await receiver.queue.join()
+    assert "sendMessage" not in telegram.methods()
+
+
+@pytest.mark.asyncio
+async def test_webhook_acknowledges_before_processing(webhook, telegram):
+    gate, handler = gated_api()
+    receiver, client = await webhook(handler)
+
+    # the backend is stuck, yet Telegram gets its answer right away
+    response = await asyncio.wait_for(post(client, callback_update(1, "show_courses")), timeout=1)
+    assert response.status_code == 200
+    assert "editMessageText" not in telegram.methods()
+
+    gate.set()
+    await receiver.queue.join()
+    method, params = telegram.calls[-1]
+    assert method == "editMessageText"
+    assert params["text"] == "📚 Available courses (1–1 of 1):"
+
+
+@pytest.mark.asyncio
+async def test_webhook_sheds_load_when_workers_are_busy(webhook, telegram):
+    gate, handler = gated_api()
+    receiver, client = await webhook(handler, workers=1, max_pending=1)
+
+    assert (await post(client, callback_update(1, "show_courses"))).status_code == 200
+    while receiver.queue.qsize():  # the only worker picks the first update up and waits for the backend
+        await asyncio.sleep(0)
+    assert (await post(client, callback_update(2, "show_courses"))).status_code == 200
+    assert (await post(client, callback_update(3, "show_courses"))).status_code == 503
+
+    gate.set()
+    await receiver.queue.join()
+    assert telegram.methods().count("editMessageText") == 2
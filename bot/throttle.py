@@ -0,0 +1,33 @@
+import time
+from typing import Callable, Dict, Tuple
+
+MAX_TRACKED_USERS = 10_000
+
+
+class UserThrottle:
+    """A token bucket per user: `burst` actions at once, then `rate` actions per second."""
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        # user id -> (tokens left, when they were counted)
+        self.buckets: Dict[int, Tuple[float, float]] = {}
+
+    def allow(self, user_id: int) -> bool:
+        now = self.clock()
+        tokens, counted = self.buckets.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - counted) * self.rate)
+        allowed = tokens >= 1
+        self.buckets[user_id] = (tokens - 1 if allowed else tokens, now)
+        if len(self.buckets) > MAX_TRACKED_USERS:
+            self.prune(now)
+        return allowed
+
+    def prune(self, now: float) -> None:
+        # a full bucket is the same as no bucket, so those users can be forgotten
+        self.buckets = {
+            user_id: (tokens, counted)
+            for user_id, (tokens, counted) in self.buckets.items()
+            if tokens + (now - counted) * self.rate < self.burst
+        }
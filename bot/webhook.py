@@ -0,0 +1,91 @@
+import asyncio
+import hmac
+import logging
+from typing import List
+from urllib.parse import urlparse
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookReceiver:
+    """Takes updates pushed by Telegram and hands them to a fixed number of workers."""
+
+    def __init__(self, application: Application, secret_token: str, workers: int = 16, max_pending: int = 1000):
+        self.application = application
+        self.secret_token = secret_token
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.tasks: List[asyncio.Task] = []
+
+    def asgi_app(self, path: str = "/") -> Starlette:
+        return Starlette(routes=[Route(path, self.receive, methods=["POST"])])
+
+    async def receive(self, request: Request) -> Response:
+        token = request.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            return Response(status_code=403)
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except Exception:
+            logger.warning("Malformed update from the webhook", exc_info=True)
+            return Response(status_code=400)
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram delivers the update again later, holding the connection would only stall its other deliveries
+            return Response(status_code=503)
+        # answered before the update is handled, Telegram waits for this response before sending more
+        return Response()
+
+    async def work(self) -> None:
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.application.process_update(update)
+            except Exception:
+                logger.exception("Failed to process update %s", update.update_id)
+            finally:
+                self.queue.task_done()
+
+    async def start(self) -> None:
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        # accepted updates were already acknowledged and will not be sent again, so they are finished first
+        await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+
+async def run_webhook(
+    application: Application, url: str, secret_token: str, port: int, workers: int, host: str = "127.0.0.1"
+) -> None:
+    """Registers `url` with Telegram and serves it until the process is told to stop."""
+    receiver = WebhookReceiver(application, secret_token, workers)
+    config = uvicorn.Config(receiver.asgi_app(urlparse(url).path or "/"), host=host, port=port, log_level="warning")
+    server = uvicorn.Server(config)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await receiver.start()
+    try:
+        await application.bot.set_webhook(url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES)
+        await server.serve()
+    finally:
+        await receiver.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await application.shutdown()
@@ -2,6 +2,8 @@ import type {Difficulty, Course, Subject, Grade} from "./types.ts";
 
 
 const baseUrl = import.meta.env.VITE_API_URL as string;
+// the largest page the API hands out, see MAX_PAGE_SIZE in backend/app/core/pagination.py
+const COURSES_PAGE_SIZE = 500;
 
 async function getArray<T>(endpoint: string): Promise<Array<T>> {
     return (await (await fetch(`${baseUrl}/${endpoint}`)).json()) as Array<T>
@@ -23,7 +25,7 @@ async function setupMap<T extends Typeable>(provider: () => Promise<Array<T>>):
 }
 
 export async function getDifficulties(): Promise<Array<Difficulty>> {
-    return await getArray('difficulties');
+    return await getArray('difficulties?inline_icons=true');
 }
 
 export async function setupGetDifficulty(): Promise<(type: string) => Difficulty | undefined> {
@@ -31,7 +33,7 @@ export async function setupGetDifficulty(): Promise<(type: string) => Difficulty
 }
 
 export async function getSubjects(): Promise<Array<Subject>> {
-    return await getArray('subjects');
+    return await getArray('subjects?inline_icons=true');
 }
 
 
@@ -46,5 +48,17 @@ export async function getGrades(): Promise<Array<string>> {
 
 
 export async function getCourses(): Promise<Array<Course>> {
-    return await getArray('courses');
+    // the catalog comes in pages, X-Next-Cursor points at the next one until the last page
+    const courses: Array<Course> = [];
+    let cursor: string | null = null;
+    do {
+        const params = new URLSearchParams({limit: String(COURSES_PAGE_SIZE)});
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        const response: Response = await fetch(`${baseUrl}/courses/?${params}`);
+        courses.push(...(await response.json()) as Array<Course>);
+        cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return courses;
 }
\ No newline at end of file